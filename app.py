@@ -2,19 +2,25 @@ import streamlit as st
 import os
 import time
 import glob
+from datetime import datetime, timedelta
 import yaml
+import pandas as pd
 from PIL import Image
 import streamlit_authenticator as stauth
 from yaml.loader import SafeLoader
 from utils.cctv_stream import start_stream
+from utils.log_reader import LogReader
+from src.event_log import EVENTS_DIR, ACTIVE_NAME, latest_event, read_events, event_days  # Read-only: detectors write
 from dotenv import load_dotenv
-from db import get_connection, log_detection_to_db, fetch_logs
+from db import get_connection, query_logs, count_logs
 
 load_dotenv()
 
 # ---------------- CONFIG ----------------
-LOG_FILE = "logs/detections.log"
+LOG_FILE = "logs/detections.log"  # Legacy text log, read only as a fallback
 CAPTURE_DIR = "data/captured"
+DB_PAGE_SIZE = 10
+LOG_PAGE_SIZE = 50
 st.set_page_config(page_title="AI-Powered Intrusion Detection", layout="centered")
 
 # ---------------- AUTHENTICATION ----------------
@@ -55,30 +61,13 @@ elif authentication_status:
     auto_refresh = st.checkbox("🔁 Auto-refresh every 5 seconds", value=False)
 
     # ----------------- HELPERS -----------------
+    active_log = LogReader(os.path.join(EVENTS_DIR, ACTIVE_NAME))
+
     def read_latest_log():
-        if not os.path.exists(LOG_FILE):
+        latest = latest_event("ALERT") or LogReader(LOG_FILE).latest("ALERT")
+        if not latest:
             return None, None
-        with open(LOG_FILE, "r") as f:
-            lines = f.readlines()
-        for line in reversed(lines):
-            if "ALERT" in line:
-                parts = line.strip().split(" | ")
-                if len(parts) == 3:
-                    timestamp, status, image_path = parts
-                    return timestamp, image_path
-        return None, None
-
-    def log_detection(status, image_path):
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        log_line = f"{timestamp} | {status} | {image_path}\n"
-
-        # Log to file
-        os.makedirs("logs", exist_ok=True)
-        with open(LOG_FILE, "a") as f:
-            f.write(log_line)
-
-        # Log to NeonDB
-        log_detection_to_db(timestamp, status, image_path)
+        return latest["timestamp"], latest["image_path"]
 
     def get_latest_captured_image():
         files = glob.glob(os.path.join(CAPTURE_DIR, "*.jpg"))
@@ -99,30 +88,71 @@ elif authentication_status:
         elif user_role == "Viewer":
             st.write(f"**Image Path:** {image_path}")
 
+    def format_events(events):
+        return "\n".join(f"{e['timestamp']} | {e['status']} | {e.get('image_path')}" for e in events)
+
     def display_full_log():
         st.subheader("📜 View Full Detection Log")
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r") as f:
-                st.text(f.read())
-        else:
-            st.warning("No log file found.")
+        days = event_days()
+        if not days:
+            st.warning("No detection events logged yet.")
+            return
+
+        day = st.selectbox("Day", ["Latest"] + days)
+        if day != "Latest":
+            next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            st.text(format_events(read_events(day, next_day)))
+            return
+
+        # Newest page of the active segment first; "Load older" extends it one page at a time
+        pages = st.session_state.setdefault("log_pages", 1)
+        records, before = [], None
+        for _ in range(pages):
+            page, before = active_log.tail(LOG_PAGE_SIZE, before=before)
+            records += page
+            if before is None:
+                break
+        st.text(format_events(records))
+        if before is not None and st.button("Load older entries"):
+            st.session_state.log_pages = pages + 1
+            st.rerun()
 
     def display_db_logs():
         st.subheader("🗄 Logs from Database")
-        logs = fetch_logs()
+
+        col_status, col_from, col_to = st.columns(3)
+        status = col_status.selectbox("Status", ["All", "ALERT", "AUTHORIZED"])
+        date_range = (col_from.date_input("From", value=None), col_to.date_input("To", value=None))
+        filters = {
+            "status": None if status == "All" else status,
+            "start": date_range[0],
+            "end": date_range[1] + timedelta(days=1) if date_range[1] else None,
+        }
+
+        # Keyset pagination: remember the cursor each page started from
+        if st.session_state.get("db_log_filters") != filters:
+            st.session_state.db_log_filters = filters
+            st.session_state.db_log_cursors = [None]
+        cursors = st.session_state.db_log_cursors
+
+        try:
+            logs, next_cursor = query_logs(cursor=cursors[-1], limit=DB_PAGE_SIZE, **filters)
+            counts = count_logs("day", **filters)
+        except Exception as e:
+            st.error(f"Database unavailable: {e}")
+            return
+
+        if counts:
+            per_day = pd.DataFrame(counts).pivot(index="bucket", columns="status", values="count").fillna(0)
+            st.bar_chart(per_day)
+
         if not logs:
             st.info("No logs in the database yet.")
             return
 
         for log in logs:
             try:
-                if len(log) == 4:
-                    _, timestamp, status, image_path = log
-                elif len(log) == 3:
-                    timestamp, status, image_path = log
-                else:
-                    continue
-
+                timestamp, status, image_path = log["timestamp"], log["status"], log["image_path"]
                 st.markdown(f"**Time:** {timestamp}  |  **Status:** {status}")
 
                 if user_role == "Admin" and image_path and os.path.exists(image_path):
@@ -135,6 +165,14 @@ elif authentication_status:
             except Exception as e:
                 st.error(f"Error displaying log: {e}")
 
+        col_prev, col_next = st.columns(2)
+        if len(cursors) > 1 and col_prev.button("⬅️ Newer"):
+            cursors.pop()
+            st.rerun()
+        if next_cursor and col_next.button("Older ➡️"):
+            cursors.append(next_cursor)
+            st.rerun()
+
     # ---------------- DISPLAY SECTIONS ----------------
     display_latest_intruder_log()  # Show for all roles
 
@@ -1,10 +1,50 @@
 import streamlit as st
+import json
 import requests
 import time
 
 # URL of your Flask backend
 FLASK_API_URL = "http://127.0.0.1:5000"
 
+STREAM_RETRIES = 3
+
+
+def task_events(task_id):
+    """
+    Yields (event, data) from the backend's server-sent events for a task
+    until its final `status` event, reconnecting from the last seen line
+    if the connection drops.
+    """
+    last_id, retries = None, 0
+    while retries <= STREAM_RETRIES:
+        headers = {"Last-Event-ID": last_id} if last_id else {}
+        try:
+            with requests.get(f"{FLASK_API_URL}/task-events/{task_id}", headers=headers,
+                              stream=True, timeout=(5, 60)) as response:
+                response.raise_for_status()
+                event, data = "message", []
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        field, _, value = line.partition(":")
+                        value = value[1:] if value.startswith(" ") else value
+                        if field == "event":
+                            event = value
+                        elif field == "data":
+                            data.append(value)
+                        elif field == "id":
+                            last_id = value
+                        continue
+                    if data:  # Blank line ends an event
+                        yield event, "\n".join(data)
+                        if event == "status":
+                            return
+                    event, data = "message", []
+        except requests.RequestException:
+            retries += 1
+            time.sleep(1)
+    raise RuntimeError("Lost the task event stream.")
+
+
 st.title("🛡️ Intruder Detection System (Dummy UI)")
 
 if st.button("🚀 Start Detection"):
@@ -12,6 +52,9 @@ if st.button("🚀 Start Detection"):
     try:
         # Step 1: Start detection
         response = requests.post(f"{FLASK_API_URL}/start-detection")
+        if response.status_code == 429:
+            st.warning("⏳ Detection queue is full, try again shortly.")
+            st.stop()
         response.raise_for_status()
         task_id = response.json().get("task_id")
 
@@ -22,24 +65,17 @@ if st.button("🚀 Start Detection"):
             status_placeholder = st.empty()
             logs_placeholder = st.empty()
 
-            # Step 2: Poll for status and logs
-            while True:
-                # Fetch task status
-                status_response = requests.get(f"{FLASK_API_URL}/task-status/{task_id}")
-                status_json = status_response.json()
-                status = status_json.get("status", "unknown")
-                status_placeholder.info(f"Task Status: {status}")
-
-                # Fetch logs
-                logs_response = requests.get(f"{FLASK_API_URL}/task-logs/{task_id}")
-                logs = logs_response.json().get("logs", [])
-                logs_text = "\n".join(logs)
-                logs_placeholder.markdown(f"**Progress:**\n```{logs_text}```")
-
-                if status in ["completed", "error", "intruder", "authorized", "none"]:
-                    break
-
-                time.sleep(2)  # Poll every 2 seconds
+            # Step 2: Follow the task's event stream; lines show up as they are logged
+            status_placeholder.info("Task Status: queued")
+            logs = []
+            for event, data in task_events(task_id):
+                if event == "log":
+                    logs.append(data)
+                    logs_text = "\n".join(logs)
+                    logs_placeholder.markdown(f"**Progress:**\n```{logs_text}```")
+                    status_placeholder.info("Task Status: running")
+                elif event == "status":
+                    status_placeholder.info(f"Task Status: {json.loads(data).get('status', 'unknown')}")
 
             # Step 3: Show result
             result_response = requests.get(f"{FLASK_API_URL}/task-results/{task_id}")
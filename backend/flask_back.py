@@ -1,96 +1,196 @@
-from flask import Flask, jsonify, request
-import threading
+from flask import Flask, Response, jsonify, request
 import sys
-import time
+import json
+import math
 import os
 from dotenv import load_dotenv
-from queue import Queue
 
 # Add source root to Python path so Flask can import main.py
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from main import wait_and_run_pipeline  # Use this to include ESP32 trigger
+from main import wait_and_run_pipeline, get_runtime  # Use this to include ESP32 trigger
+from db import query_logs, count_logs
+from src.alert_dispatcher import get_alert_dispatcher
+from backend.jobs import JobManager, QueueFull, JOB_DEADLINE_S, STATE_DONE, STATE_ERROR
 
 # Load environment variables
 load_dotenv()
-task_logs = {}
 
 app = Flask(__name__)
 
-# Queue and status track ing
-task_queue = Queue()
-task_status = {}
+# Bounded worker pool + job store (finished jobs expire after JOB_TTL_S)
+jobs = JobManager()
+LONG_POLL_MAX_S = 30.0
+SSE_KEEPALIVE_S = 15.0
 
-def background_task(task_id):
+def detection_job(job):
     """
-    This function runs the detection pipeline (with ESP32 trigger)
-    in the background and updates the task status and logs.
+    Runs the detection pipeline (with ESP32 trigger) on a job worker,
+    logging to the job; gives up waiting once the job is cancelled or
+    its deadline passes.
     """
-    def log_callback(msg):
-        task_logs[task_id].append(f"{time.strftime('%H:%M:%S')} | {msg}")
-
-    try:
-        task_logs[task_id] = []  # Initialize log list
-
-        # Wait for trigger and run pipeline with logging
-        status = wait_and_run_pipeline(log_callback=log_callback)
-        
-        task_status[task_id] = {
-            "status": status,
-            "message": "Task completed successfully"
-        }
-
-    except Exception as e:
-        task_status[task_id] = {
-            "status": "error",
-            "message": str(e)
-        }
-        task_logs[task_id].append(f"❌ Error: {str(e)}")
+    return wait_and_run_pipeline(log_callback=job.log, should_stop=job.should_stop)
 
 @app.route("/start-detection", methods=["POST"])
 def start_detection():
     """
-    Start the detection process (with ESP32 trigger) in background.
+    Queue a detection job (with ESP32 trigger). Body: {"timeout": seconds}
+    to wait less than JOB_DEADLINE_S for the trigger. 429 when saturated.
     """
-    task_id = str(int(time.time()))
-    task_status[task_id] = {"status": "running", "message": "Task started."}
-
-    thread = threading.Thread(target=background_task, args=(task_id,))
-    thread.start()
+    body = request.get_json(silent=True) or {}
+    try:
+        timeout = float(body.get("timeout", JOB_DEADLINE_S))
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout must be a number of seconds"}), 400
+    if not (math.isfinite(timeout) and timeout > 0):
+        return jsonify({"error": "timeout must be a positive, finite number of seconds"}), 400
+    try:
+        job = jobs.submit(detection_job, deadline_s=timeout)
+    except QueueFull as e:
+        return jsonify({"error": f"Too many detection jobs: {e}"}), 429, {"Retry-After": "10"}
 
-    return jsonify({"task_id": task_id, "status": "Task started."}), 202
+    return jsonify({"task_id": job.id, "status": "Task queued."}), 202
 
 @app.route("/task-status/<task_id>", methods=["GET"])
 def get_task_status(task_id):
-    if task_id not in task_status:
+    job = jobs.store.get(task_id)
+    if job is None:
         return jsonify({"error": "Task not found"}), 404
-    
-    return jsonify(task_status[task_id])
+
+    return jsonify(job.to_dict())
 
 @app.route("/task-results/<task_id>", methods=["GET"])
 def get_task_results(task_id):
-    if task_id not in task_status or task_status[task_id]["status"] == "running":
+    job = jobs.store.get(task_id)
+    if job is None or not job.done:
         return jsonify({"error": "Task not completed yet."}), 400
-    
-    result = task_status[task_id]
-    if result["status"] == "error":
-        return jsonify({"error": result["message"]}), 500
 
+    if job.state == STATE_ERROR:
+        return jsonify({"error": job.message}), 500
+
+    result = job.result if job.state == STATE_DONE else job.state
     return jsonify({
-        "status": result["status"],
-        "message": result["message"],
-        "detection_result": result["status"]
+        "status": result,
+        "message": job.message,
+        "detection_result": result
     })
 
+@app.route("/task-cancel/<task_id>", methods=["POST"])
+def cancel_task(task_id):
+    job = jobs.cancel(task_id)
+    if job is None:
+        return jsonify({"error": "Task not found"}), 404
+    return jsonify(job.to_dict()), 202 if not job.done else 200
+
+@app.route("/admin/jobs-status", methods=["GET"])
+def admin_jobs_status():
+    """Worker pool size, queue depth and jobs per state."""
+    return jsonify(jobs.status())
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """
+    Rebuilds the gallery (and optionally the model) in the background and
+    swaps it in between requests. Body: {"model": true} to reload the model too.
+    """
+    body = request.get_json(silent=True) or {}
+    runtime = get_runtime()
+    runtime.request_reload(reload_model=bool(body.get("model")))
+    return jsonify({"status": "reloading", "current_version": runtime.version}), 202
+
+@app.route("/admin/model-status", methods=["GET"])
+def admin_model_status():
+    return jsonify(get_runtime().status())
+
+@app.route("/admin/alerts-status", methods=["GET"])
+def admin_alerts_status():
+    """Alert delivery counters (queued, delivered, retried, dead-lettered) and connection reuse."""
+    from src.notifier import get_smtp_client
+    from src.notifier_telegram import connection_stats
+    status = get_alert_dispatcher().status()
+    status["connections"] = {"smtp": get_smtp_client().status(), "http": connection_stats()}
+    return jsonify(status)
+
+@app.route("/logs", methods=["GET"])
+def get_logs():
+    """
+    Detection logs, newest first.
+    Query: status, start, end (ISO timestamps, end exclusive), limit (<= 200),
+    cursor (the `next_cursor` of the previous page).
+    """
+    args = request.args
+    try:
+        limit = min(int(args.get("limit", 50)), 200)
+        rows, next_cursor = query_logs(status=args.get("status"), start=args.get("start"),
+                                       end=args.get("end"), cursor=args.get("cursor"), limit=limit)
+    except ValueError as e:
+        return jsonify({"error": f"Bad query: {e}"}), 400
+    return jsonify({"logs": rows, "next_cursor": next_cursor})
+
+@app.route("/logs/stats", methods=["GET"])
+def get_log_stats():
+    """Counts per ?bucket=hour|day and status, with the same filters as /logs."""
+    args = request.args
+    try:
+        counts = count_logs(bucket=args.get("bucket", "day"), status=args.get("status"),
+                            start=args.get("start"), end=args.get("end"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"counts": counts})
+
 @app.route("/")
 def index():
     return "Intruder Detection API is running."
 
 @app.route("/task-logs/<task_id>", methods=["GET"])
 def get_task_logs(task_id):
-    if task_id not in task_logs:
+    """
+    Log lines after ?since (the `next` of the previous call; all lines if
+    omitted). With ?wait=<seconds> this long-polls until a line arrives or
+    the task finishes.
+    """
+    job = jobs.store.get(task_id)
+    if job is None:
         return jsonify({"logs": []})
-    return jsonify({"logs": task_logs[task_id]})
+    try:
+        since = int(request.args.get("since", 0))
+        wait = min(float(request.args.get("wait", 0)), LONG_POLL_MAX_S)
+    except ValueError:
+        return jsonify({"error": "since and wait must be numbers"}), 400
+    lines, cursor = job.wait(since, wait) if wait > 0 else job.logs_since(since)
+    return jsonify(dict(job.to_dict(), logs=lines, next=cursor))
+
+@app.route("/task-events/<task_id>", methods=["GET"])
+def stream_task_events(task_id):
+    """
+    Server-sent events: a `log` event per new line (id = line cursor, so a
+    reconnect with Last-Event-ID resumes), then one `status` event with
+    the final task status, after which the stream ends.
+    """
+    job = jobs.store.get(task_id)
+    if job is None:
+        return jsonify({"error": "Task not found"}), 404
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.args.get("since", 0))
+    except ValueError:
+        since = 0
+
+    def events(since):
+        yield "retry: 2000\n\n"
+        while True:
+            lines, cursor = job.wait(since, SSE_KEEPALIVE_S)
+            for i, line in enumerate(lines, start=cursor - len(lines) + 1):
+                data = "\n".join(f"data: {part}" for part in line.split("\n"))
+                yield f"id: {i}\nevent: log\n{data}\n\n"
+            since = cursor
+            if job.done and not job.logs_since(since)[0]:
+                yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            if not lines:
+                yield ": keepalive\n\n"  # Lets proxies and clients see the connection is alive
+
+    return Response(events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
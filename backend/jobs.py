@@ -0,0 +1,201 @@
+# backend/jobs.py
+#
+# Detection jobs for the Flask backend: a bounded queue served by a fixed
+# pool of worker threads, with admission control, cancellation, per-job
+# deadlines and a job store that forgets finished jobs after a TTL.
+
+import os
+import math
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))  # Jobs share one sensor, so one at a time by default
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "4"))
+JOB_DEADLINE_S = float(os.getenv("JOB_DEADLINE_S", "300"))  # Default, and cap, for ?timeout
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "3600"))           # Finished jobs are kept this long
+JOB_MAX_LOG_LINES = 500
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_ERROR = "error"
+STATE_CANCELLED = "cancelled"
+STATE_TIMEOUT = "timeout"
+FINISHED_STATES = (STATE_DONE, STATE_ERROR, STATE_CANCELLED, STATE_TIMEOUT)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, target, deadline_s=JOB_DEADLINE_S):
+        self.id = uuid.uuid4().hex
+        self.target = target
+        self.state = STATE_QUEUED
+        self.result = None
+        self.message = "Task queued."
+        self.created = time.time()
+        self.finished = None
+        self.deadline = time.monotonic() + deadline_s
+        self.cancel_event = threading.Event()
+        self.logs = deque(maxlen=JOB_MAX_LOG_LINES)
+        self.log_count = 0  # Lines ever logged; the cursor for logs_since()
+        self._cond = threading.Condition()
+
+    def log(self, msg):
+        with self._cond:
+            self.logs.append(f"{time.strftime('%H:%M:%S')} | {msg}")
+            self.log_count += 1
+            self._cond.notify_all()
+
+    def log_lines(self):
+        with self._cond:
+            return list(self.logs)
+
+    def logs_since(self, since=0):
+        """(lines logged after cursor `since`, new cursor). Lines already evicted from the cap are skipped."""
+        with self._cond:
+            return self._since(since)
+
+    def _since(self, since):
+        first = self.log_count - len(self.logs)
+        skip = max(since - first, 0)
+        return list(self.logs)[skip:], self.log_count
+
+    def wait(self, since=0, timeout=None):
+        """
+        Blocks until there are lines after `since`, the job finishes, or
+        `timeout` passes; returns logs_since(since).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.log_count > since or self.done, timeout)
+            return self._since(since)
+
+    def _set(self, state, message):
+        with self._cond:
+            self.state, self.message = state, message
+            self._cond.notify_all()
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def should_stop(self):
+        return self.cancel_event.is_set() or self.remaining() <= 0
+
+    def finish(self, state, result=None, message=""):
+        self.result = result
+        self.finished = time.time()
+        self._set(state, message)
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    def to_dict(self):
+        # `status` keeps the old API's meaning: the detection result once finished
+        status = self.result if self.state == STATE_DONE else self.state
+        return {"task_id": self.id, "status": status, "state": self.state, "message": self.message,
+                "done": self.done, "created": self.created, "finished": self.finished}
+
+
+class JobStore:
+    """Jobs by id; finished jobs are evicted `ttl` seconds after they finish."""
+
+    def __init__(self, ttl=JOB_TTL_S):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._evict()
+            self._jobs[job.id] = job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def values(self):
+        with self._lock:
+            self._evict()
+            return list(self._jobs.values())
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+class JobManager:
+    """
+    submit(target) queues `target(job)` and returns the Job, or raises
+    QueueFull when every worker is busy and the queue is full. Targets get
+    the Job so they can log to it and poll job.should_stop() for
+    cancellation or an expired deadline.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, ttl=JOB_TTL_S):
+        self.store = JobStore(ttl)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._workers = [threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, target, deadline_s=JOB_DEADLINE_S):
+        if not (math.isfinite(deadline_s) and deadline_s > 0):
+            deadline_s = JOB_DEADLINE_S  # NaN would never expire: min(nan, cap) is nan
+        job = Job(target, min(deadline_s, JOB_DEADLINE_S))
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise QueueFull(f"{self._queue.qsize()} job(s) already queued")
+        self.store.add(job)
+        return job
+
+    def cancel(self, job_id):
+        """Queued jobs are dropped when a worker reaches them; running ones stop at their next check."""
+        job = self.store.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_event.set()
+        job.log("🛑 Cancellation requested.")
+        return job
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancel_event.is_set():
+                    job.finish(STATE_CANCELLED, message="Cancelled before it started.")
+                    continue
+                if job.remaining() <= 0:
+                    job.finish(STATE_TIMEOUT, message="Deadline passed while queued.")
+                    continue
+                job._set(STATE_RUNNING, "Task started.")
+                try:
+                    result = job.target(job)
+                except Exception as e:
+                    job.log(f"❌ Error: {e}")
+                    job.finish(STATE_ERROR, message=str(e))
+                    continue
+                if job.cancel_event.is_set():
+                    job.finish(STATE_CANCELLED, result, "Task cancelled.")
+                elif job.remaining() <= 0 and result == "no_trigger":
+                    job.finish(STATE_TIMEOUT, result, "Deadline passed before a trigger arrived.")
+                else:
+                    job.finish(STATE_DONE, result, "Task completed successfully")
+            finally:
+                self._queue.task_done()
+
+    def status(self):
+        states = {}
+        for job in self.store.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {"workers": len(self._workers), "queued": self._queue.qsize(),
+                "queue_size": self._queue.maxsize, "jobs": states}
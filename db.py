@@ -1,33 +1,435 @@
-import psycopg2
 import os
-from datetime import datetime
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# "postgres" (Neon) or "sqlite" (local stand-in for development and tests)
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres")
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", os.path.join("logs", "detections.sqlite3"))
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "4"))
+DB_BATCH_SIZE = 200          # Rows per INSERT
+DB_FLUSH_INTERVAL_S = 1.0    # Max time a queued row waits before a flush
+DB_RETRY_INTERVAL_S = 30.0   # How often the spool is replayed while the DB is down
+SPOOL_PATH = os.getenv("DB_SPOOL_PATH", os.path.join("logs", "db_spool.jsonl"))
+
+INSERT_SQL = "INSERT INTO detection_logs (timestamp, status, image_path) VALUES %s"
+
+# Applied in order, once each, and recorded in schema_migrations.
+# (version, description, {backend: statements})
+MIGRATIONS = [
+    (1, "detection_logs table", {
+        "postgres": ["""CREATE TABLE IF NOT EXISTS detection_logs (
+                            id SERIAL PRIMARY KEY,
+                            timestamp TIMESTAMP NOT NULL,
+                            status TEXT NOT NULL,
+                            image_path TEXT)"""],
+        "sqlite": ["""CREATE TABLE IF NOT EXISTS detection_logs (
+                          id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          timestamp TEXT NOT NULL,
+                          status TEXT NOT NULL,
+                          image_path TEXT)"""],
+    }),
+    (2, "index for newest-first paging", {
+        "postgres": ["CREATE INDEX IF NOT EXISTS idx_detection_logs_ts ON detection_logs (timestamp DESC, id DESC)"],
+        "sqlite": ["CREATE INDEX IF NOT EXISTS idx_detection_logs_ts ON detection_logs (timestamp DESC, id DESC)"],
+    }),
+    (3, "index for status filters", {
+        "postgres": ["CREATE INDEX IF NOT EXISTS idx_detection_logs_status_ts ON detection_logs (status, timestamp DESC, id DESC)"],
+        "sqlite": ["CREATE INDEX IF NOT EXISTS idx_detection_logs_status_ts ON detection_logs (status, timestamp DESC, id DESC)"],
+    }),
+]
+
+def _sql(query):
+    """Queries are written with psycopg2 placeholders; SQLite wants '?'."""
+    return query.replace("%s", "?") if DB_BACKEND == "sqlite" else query
+
 
 def get_connection():
+    """A new, unpooled connection (used by test_db.py and one-off scripts)."""
+    if DB_BACKEND == "sqlite":
+        os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+        return sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+
+    import psycopg2  # Imported on first use to keep `import db` cheap
     return psycopg2.connect(
         host=os.getenv("NEON_HOST"),
         dbname=os.getenv("NEON_DB"),
         user=os.getenv("NEON_USER"),
         password=os.getenv("NEON_PASSWORD"),
-        port=5432,
-        sslmode="require"
+        port=int(os.getenv("NEON_PORT", "5432")),
+        sslmode="require",
+        connect_timeout=5,
     )
 
-def log_detection_to_db(timestamp, status, image_path):
-    conn = get_connection()
+
+class _SQLitePool:
+    """Same getconn/putconn surface as psycopg2's pool; SQLite connections are cheap."""
+
+    def getconn(self):
+        return get_connection()
+
+    def putconn(self, conn, close=False):
+        conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if DB_BACKEND == "sqlite":
+                _pool = _SQLitePool()
+            else:
+                from psycopg2.pool import ThreadedConnectionPool
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX,
+                    host=os.getenv("NEON_HOST"),
+                    dbname=os.getenv("NEON_DB"),
+                    user=os.getenv("NEON_USER"),
+                    password=os.getenv("NEON_PASSWORD"),
+                    port=int(os.getenv("NEON_PORT", "5432")),
+                    sslmode="require",
+                    connect_timeout=5,
+                    keepalives=1,
+                )
+        return _pool
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def migrate(conn):
+    """Applies pending MIGRATIONS on `conn`. Returns the versions applied."""
     cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO detection_logs (timestamp, status, image_path) VALUES (%s, %s, %s)",
-        (timestamp, status, image_path)
-    )
-    conn.commit()
+    cur.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, description TEXT)")
+    cur.execute("SELECT version FROM schema_migrations")
+    done = {row[0] for row in cur.fetchall()}
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version in done:
+            continue
+        for statement in statements[DB_BACKEND]:
+            cur.execute(statement)
+        cur.execute(_sql("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)"),
+                    (version, description))
+        conn.commit()
+        applied.append(version)
+        print(f"[INFO] Applied DB migration {version}: {description}")
     cur.close()
-    conn.close()
+    return applied
+
+
+def ensure_schema(pool):
+    """Runs migrations once per process, on first use of the pool."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        conn = pool.getconn()
+        try:
+            migrate(conn)
+        except Exception:
+            conn.rollback()
+            pool.putconn(conn, close=True)
+            raise
+        pool.putconn(conn)
+        _schema_ready = True
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrows a pooled connection; commits on success, rolls back on error.
+    Connections that failed are dropped instead of going back to the pool.
+    """
+    pool = get_pool()
+    ensure_schema(pool)
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        broken = True
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+
+def insert_detections(rows):
+    """Inserts (timestamp, status, image_path) rows in one statement and one transaction."""
+    rows = [tuple(r) for r in rows]
+    if not rows:
+        return 0
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        if DB_BACKEND == "sqlite":
+            cur.executemany(_sql(INSERT_SQL.replace("%s", "(%s, %s, %s)")), rows)
+        else:
+            from psycopg2.extras import execute_values
+            execute_values(cur, INSERT_SQL, rows, page_size=DB_BATCH_SIZE)
+        cur.close()
+    return len(rows)
+
+
+class DetectionLogWriter:
+    """
+    Background writer for detection_logs. log() only enqueues; a worker
+    thread flushes in batches. If the database is unreachable the batch is
+    appended to a local JSONL spool and replayed once the database answers
+    again, so callers on the alert path never block on (or fail because of)
+    the network.
+    """
+
+    def __init__(self, spool_path=SPOOL_PATH, batch_size=DB_BATCH_SIZE,
+                 flush_interval=DB_FLUSH_INTERVAL_S, retry_interval=DB_RETRY_INTERVAL_S):
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._next_replay = 0.0
+        self.written = 0
+        self.spooled = 0
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, timestamp, status, image_path):
+        with self._idle:
+            self._pending += 1
+        self._queue.put((str(timestamp), status, image_path))
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far has been written or spooled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            if self._has_spool() and time.monotonic() >= self._next_replay:
+                try:
+                    self._replay_spool()
+                except Exception as e:
+                    print(f"[WARN] Could not read the DB spool: {e}")
+                    self._next_replay = time.monotonic() + self.retry_interval
+
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                self.written += insert_detections(batch)
+            except Exception as e:
+                print(f"[WARN] DB write failed, spooling {len(batch)} row(s): {e}")
+                self._spool(batch)
+                self._next_replay = time.monotonic() + self.retry_interval
+            finally:
+                with self._idle:
+                    self._pending -= len(batch)
+                    self._idle.notify_all()
+
+    def _has_spool(self):
+        return os.path.exists(self.spool_path) or os.path.exists(self.spool_path + ".replay")
+
+    def _spool(self, rows):
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.spooled += len(rows)
+
+    def _replay_spool(self):
+        # Move the spool aside first so new failures append to a fresh file.
+        # A leftover .replay (interrupted or failed replay) goes first.
+        replaying = self.spool_path + ".replay"
+        if not os.path.exists(replaying):
+            os.replace(self.spool_path, replaying)
+
+        with open(replaying, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        done = 0
+        try:
+            while done < len(rows):
+                done += insert_detections(rows[done:done + self.batch_size])
+        except Exception as e:
+            print(f"[WARN] Spool replay failed, retrying in {self.retry_interval:.0f}s: {e}")
+            self._next_replay = time.monotonic() + self.retry_interval
+            self._rewrite(replaying, rows[done:])
+            return
+        finally:
+            self.written += done
+
+        os.remove(replaying)
+        if rows:
+            print(f"[INFO] Replayed {len(rows)} spooled detection log(s) to the database.")
+
+    @staticmethod
+    def _rewrite(path, rows):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        os.replace(tmp, path)
+
+    def status(self):
+        return {
+            "queued": self._pending,
+            "written": self.written,
+            "spooled": self.spooled,
+            "spool_pending": self._has_spool(),
+        }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """Shared background writer, started on first use and flushed at exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DetectionLogWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def log_detection_to_db(timestamp, status, image_path):
+    """Queues one detection log row; returns immediately."""
+    get_log_writer().log(timestamp, status, image_path)
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor ("<timestamp>|<id>") for the row a page ended on."""
+    return f"{row['timestamp']}|{row['id']}"
+
+
+def decode_cursor(cursor):
+    timestamp, _, row_id = cursor.rpartition("|")
+    return timestamp, int(row_id)
+
+
+def _filters(status=None, start=None, end=None):
+    clauses, params = [], []
+    if status:
+        clauses.append("status = %s")
+        params.append(status)
+    if start:
+        clauses.append("timestamp >= %s")
+        params.append(str(start))
+    if end:
+        clauses.append("timestamp < %s")
+        params.append(str(end))
+    return clauses, params
+
+
+def query_logs(status=None, start=None, end=None, cursor=None, limit=50):
+    """
+    One page of detection logs, newest first, filtered by status and the
+    [start, end) time range. Pages are keyset-based on (timestamp, id), so
+    deep pages cost the same as the first one. Returns (rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    clauses, params = _filters(status, start, end)
+    if cursor:
+        clauses.append("(timestamp, id) < (%s, %s)")
+        params.extend(decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_sql(f"SELECT id, timestamp, status, image_path FROM detection_logs {where} "
+                         "ORDER BY timestamp DESC, id DESC LIMIT %s"), params + [limit + 1])
+        fetched = cur.fetchall()
+        cur.close()
+
+    rows = [{"id": r[0], "timestamp": str(r[1]), "status": r[2], "image_path": r[3]} for r in fetched[:limit]]
+    next_cursor = encode_cursor(rows[-1]) if len(fetched) > limit else None
+    return rows, next_cursor
+
+
+_BUCKETS = {
+    "postgres": {"hour": "date_trunc('hour', timestamp::timestamp)", "day": "date_trunc('day', timestamp::timestamp)"},
+    "sqlite": {"hour": "strftime('%Y-%m-%d %H:00:00', timestamp)", "day": "strftime('%Y-%m-%d', timestamp)"},
+}
+
+
+def count_logs(bucket="day", status=None, start=None, end=None):
+    """Detection counts per hour/day and status, aggregated in the database."""
+    if bucket not in ("hour", "day"):
+        raise ValueError(f"Unknown bucket: {bucket}")
+    expr = _BUCKETS[DB_BACKEND][bucket]
+    clauses, params = _filters(status, start, end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        # strftime patterns contain '%', so only swap placeholders in the WHERE part
+        cur.execute(f"SELECT {expr} AS bucket, status, COUNT(*) FROM detection_logs {_sql(where)} "
+                    "GROUP BY 1, 2 ORDER BY 1, 2", params)
+        rows = cur.fetchall()
+        cur.close()
+    return [{"bucket": str(r[0]), "status": r[1], "count": r[2]} for r in rows]
+
 
 def fetch_logs(limit=10):
+    """Latest `limit` rows as (timestamp, status, image_path) tuples."""
+    rows, _ = query_logs(limit=limit)
+    return [(r["timestamp"], r["status"], r["image_path"]) for r in rows]
+
+
+if __name__ == "__main__":
+    # python db.py  -> applies pending schema migrations
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT timestamp, status, image_path FROM detection_logs ORDER BY timestamp DESC LIMIT %s", (limit,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    try:
+        applied = migrate(conn)
+        print(f"✅ Schema up to date ({len(applied)} migration(s) applied).")
+    finally:
+        conn.close()
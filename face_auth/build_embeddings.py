@@ -1,4 +1,5 @@
 import os
+import sys
 import uuid
 import cv2
 import pickle
@@ -6,6 +7,11 @@ import numpy as np
 from datetime import datetime
 from deepface import DeepFace
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.matcher import as_matcher, METRIC_EUCLIDEAN
+from src.gallery_store import GalleryStore, gallery_exists
+
 # Constants
 EMBEDDINGS_PATH = "data/embeddings/authorized_embeddings.pkl"
 CAPTURED_DIR = "data/captured"
@@ -46,6 +52,9 @@ def extract_embedding(image_path):
 
 def load_embeddings():
     print(f"[INFO] Loading known embeddings from: {EMBEDDINGS_PATH}")
+    if gallery_exists(EMBEDDINGS_PATH):
+        return GalleryStore(EMBEDDINGS_PATH).load_matcher()
+
     if not os.path.exists(EMBEDDINGS_PATH):
         raise FileNotFoundError(f"Embeddings file not found at: {EMBEDDINGS_PATH}")
     
@@ -54,18 +63,15 @@ def load_embeddings():
 
     return embeddings_db
 
-def verify_identity(input_embedding, embeddings_db):
+def verify_identity(input_embedding, embeddings_db, top_k=3):
     print("[INFO] Verifying identity...")
-    best_match = None
-    best_distance = float("inf")
+    matcher = as_matcher(embeddings_db)
+    matches = matcher.search(input_embedding, k=top_k, metric=METRIC_EUCLIDEAN)
+
+    for name, distance in matches:
+        print(f"[DEBUG] Closest: {name}: distance = {distance:.4f}")
 
-    for name, embeddings in embeddings_db.items():
-        for i, stored_embedding in enumerate(embeddings):
-            distance = np.linalg.norm(input_embedding - stored_embedding)
-            print(f"[DEBUG] Compared with {name} [sample {i+1}]: distance = {distance:.4f}")
-            if distance < best_distance:
-                best_distance = distance
-                best_match = name
+    best_match, best_distance = matches[0] if matches else (None, float("inf"))
 
     if best_distance < DISTANCE_THRESHOLD:
         return "verified", best_match, best_distance
@@ -76,7 +82,7 @@ def main():
     try:
         image_path = capture_image()
         embedding = extract_embedding(image_path)
-        embeddings_db = load_embeddings()
+        embeddings_db = as_matcher(load_embeddings())
         status, identity, best_distance = verify_identity(embedding, embeddings_db)
 
         result = {
@@ -1,11 +1,17 @@
 import cv2
 import os
+import sys
 import pickle
 import numpy as np
 from datetime import datetime
 from deepface import DeepFace
 from numpy.linalg import norm
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.matcher import as_matcher
+from src.gallery_store import GalleryStore, gallery_exists
+
 # Constants
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EMBEDDINGS_PATH = os.path.join(BASE_DIR, "embeddings", "authorized_embeddings.pkl")
@@ -19,6 +25,8 @@ def cosine_distance(a, b):
 
 # Load known embeddings
 def load_embeddings(path=EMBEDDINGS_PATH):
+    if gallery_exists(path):
+        return GalleryStore(path).load_matcher()
     if not os.path.exists(path):
         raise FileNotFoundError(f"Embeddings file not found at: {path}")
     with open(path, "rb") as f:
@@ -40,20 +48,15 @@ def extract_embedding(image_path):
     return None
 
 # Compare captured embedding with known embeddings
-def verify_embedding(target_embedding, known_embeddings, threshold=THRESHOLD):
-    min_distance = float("inf")
-    best_match = None
-
-    print("\n[DEBUG] Comparing with known embeddings:\n")
+def verify_embedding(target_embedding, known_embeddings, threshold=THRESHOLD, top_k=3):
+    matcher = as_matcher(known_embeddings)
+    matches = matcher.search(target_embedding, k=top_k)
 
-    for name, embeddings_list in known_embeddings.items():
-        for i, known_embedding in enumerate(embeddings_list):
-            distance = cosine_distance(target_embedding, np.array(known_embedding))
-            print(f"  → Compared with {name} [sample {i+1}]: distance = {round(distance, 4)}")
+    print("\n[DEBUG] Closest known identities:\n")
+    for name, distance in matches:
+        print(f"  → {name}: distance = {round(distance, 4)}")
 
-            if distance < min_distance:
-                min_distance = distance
-                best_match = name
+    best_match, min_distance = matches[0] if matches else (None, float("inf"))
 
     if min_distance <= threshold:
         print(f"[INFO] Closest match: {best_match} with distance = {round(min_distance, 4)}")
@@ -95,7 +98,7 @@ def main():
 
         if embedding is not None:
             print("[INFO] Verifying identity...")
-            known_embeddings = load_embeddings()
+            known_embeddings = as_matcher(load_embeddings())
             result = verify_embedding(embedding, known_embeddings)
             result["image_path"] = img_path
             print("[RESULT]", result)
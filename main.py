@@ -1,13 +1,21 @@
 import os
+import sys
 import time
+import threading
 from dotenv import load_dotenv
 
-from src.serial_listener import wait_for_trigger
-from src.camera import capture_images
-from src.predict_with_embed import verify_captured_images, load_model, load_embeddings
-from src.notifier import send_alert  # Email
-from src.notifier_telegram import send_telegram_alert, send_tg_location  # Telegram
-from db import log_detection_to_db 
+from src.serial_listener import wait_for_trigger, get_serial_service
+from src.camera import stream_frames, get_camera_stream
+from src.evidence import get_evidence_writer, REASON_ALERT, REASON_AUTHORIZED
+from src.predict_with_embed import verify_stream, load_model, load_matcher
+from src.hot_reload import ModelHolder
+from src.inference_server import InferenceClient
+from src.fusion import EvidenceFusion, frame_quality, STATUS_AUTHORIZED, STATUS_INTRUDER
+from src.alert_dispatcher import Alert, get_alert_dispatcher  # Email + Telegram, off the detection path
+from src.location import get_location_provider
+from src.event_log import get_event_logger
+from src.zones import ZoneRuntime, load_config, ZONES_CONFIG
+from db import log_detection_to_db
 
 # Load environment variables
 load_dotenv()
@@ -18,103 +26,168 @@ DETECTOR_BACKEND = "mtcnn"
 ENFORCE_DETECTION = False  # For inference, allow fallback even if face not found
 THRESHOLD = 0.4  # Cosine distance threshold
 EMBEDDINGS_PATH = os.path.join("face_auth", "embeddings", "authorized_embeddings.pkl")
-VERIFIED_LABEL = "Authorized"
-LOG_PATH = "logs/detections.log"
-
-# Load model and embeddings
-model = load_model()
-embeddings_db = load_embeddings(EMBEDDINGS_PATH)
-
-def log_event(status, image_path):
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    with open(LOG_PATH, "a") as f:
-        f.write(f"{timestamp} | {status} | {image_path}\n")
-
-    log_detection_to_db(timestamp, status, image_path)
-
-def run_pipeline(log_callback=print):  # Default to print if no callback
-    log_callback("\n📸 Capturing images...")
-    image_paths = capture_images(num_images=5, delay=2)
+NUM_FRAMES = 5  # Upper bound on frames per trigger; fusion usually stops earlier
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime():
+    """
+    Model + embeddings holder, built on first use so importing this module
+    stays cheap. If the inference daemon (src/inference_server.py) is up,
+    frames are handed to it and TensorFlow is never loaded here.
+    The holder swaps in new versions when the gallery changes.
+    """
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            client = InferenceClient()
+            if client.available():
+                print(f"[INFO] Using inference daemon at {client.socket_path}")
+                model_loader = lambda: client
+            else:
+                model_loader = load_model
+            runtime = ModelHolder(EMBEDDINGS_PATH, model_loader, load_matcher)
+            runtime.load()
+            runtime.start_watching()
+            _runtime = runtime
+        return _runtime
+
+def log_event(status, image_path, **fields):
+    event = get_event_logger().log(status, image_path, **fields)
+    log_detection_to_db(event["timestamp"], status, image_path)
+
+def handle_authorized(name, frame, score, log_callback=print, **fields):
+    saved = get_evidence_writer().save(frame, REASON_AUTHORIZED)
+    img_path = get_evidence_writer().path_for(frame) if saved else "-"  # Not retained under the default policy
+    log_callback(f"✅ Authorized person detected: {name} ({score:.2f}) - {img_path}")
+    log_event("AUTHORIZED", img_path, identity=name, score=round(float(score), 4), **fields)
+    return "authorized"
+
+def handle_intruder(frame, score, log_callback=print, **fields):
+    # Alerts attach the image, so wait for the background write
+    img_path = get_evidence_writer().save(frame, REASON_ALERT).result()
+    log_callback(f"🚨 Intruder detected ({score:.2f}) - {img_path}")
+    log_event("ALERT", img_path, score=round(float(score), 4), **fields)
+
+    if get_alert_dispatcher().dispatch(Alert(img_path, score=score, quality=frame_quality(frame))):
+        log_callback("📨 Email and Telegram alerts queued.")
+    else:
+        log_callback("⚠️ Alert queue full; alert written to the dead-letter file.")
+
+    return "intruder"
+
+def run_pipeline(log_callback=print, frames=None, zone=None):  # Default to print if no callback
+    """
+    Streams frames from the camera ring buffer into recognition and fuses
+    the per-frame results (see src/fusion.py). Capture stops as soon as the
+    fused decision can no longer change. The zone runtime passes frames it
+    already captured, and the zone name is recorded with the event.
+    """
+    with get_runtime().acquire() as snapshot:  # Pinned for this run even if a reload lands meanwhile
+        return _run_pipeline(snapshot.model, snapshot.matcher, log_callback, frames, zone)
+
+def _run_pipeline(model, matcher, log_callback, frames=None, zone=None):
+    started = time.perf_counter()
+    if frames is None:
+        log_callback("\n📸 Capturing images...")
+        frames = stream_frames(num_images=NUM_FRAMES)
+    fields = {"zone": zone} if zone else {}
+    fusion = EvidenceFusion(threshold=THRESHOLD)
+
+    seen = 0
+    best_frames = {}  # name -> (rank, frame): closest frame per identity, sharpest stranger frame
+    for name, frame, score in verify_stream(frames, model, matcher):
+        seen += 1
+        quality = frame_quality(frame)
+        decision = fusion.add(name, score, quality)
+        if score is None:
+            continue
+
+        log_callback(f"🧠 Frame {seen}: {name} ({score:.2f}) → {decision.status}")
+        rank = -quality if name == "Intruder" else score
+        if name not in best_frames or rank < best_frames[name][0]:
+            best_frames[name] = (rank, frame)
+
+        if fusion.is_stable(NUM_FRAMES - seen):
+            break
 
-    if not image_paths:
+    if seen == 0:
         log_callback("❌ No images captured.")
         return "none"
 
-    results = verify_captured_images(image_paths, model, embeddings_db)
-
-    for name, img_path, score in results:
-        if score is not None:
-            if VERIFIED_LABEL.lower() in name.lower():
-                if score < THRESHOLD:  # Only proceed if score is below the threshold
-                    log_callback(f"✅ Authorized person detected: {name} ({score:.2f}) - {img_path}")
-                    log_event("AUTHORIZED", img_path)
-                    return "authorized"
-                else:
-                    log_callback(f"⚠️ Authorized person detected, but score above threshold: {name} ({score:.2f}) - {img_path}")
-                    return "none"  # No need to take further action
-
-            else:  # Intruder detected
-                if score < THRESHOLD:  # Only proceed if score is below the threshold
-                    log_callback(f"🚨 Intruder detected: {name} ({score:.2f}) - {img_path}")
-                    log_event("ALERT", img_path)
-
-                    log_callback("📧 Sending email alert...")
-                    try:
-                        send_alert(img_path)
-                    except Exception as e:
-                        log_callback(f"⚠️ Email failed: {e}")
-
-                    log_callback("📨 Sending Telegram alert...")
-                    try:
-                        location = send_tg_location()
-                        send_telegram_alert(img_path, location)
-                    except Exception as e:
-                        log_callback(f"⚠️ Telegram failed: {e}")
-
-                    return "intruder"
-                else:
-                    log_callback(f"⚠️ Detected potential intruder, but score above threshold: {name} ({score:.2f}) - {img_path}")
-                    return "none"  # No need to take further action
+    decision = fusion.decision()
+    log_callback(f"⏱️ {decision} after {seen} frame(s) in {time.perf_counter() - started:.2f}s")
+
+    if decision.status == STATUS_AUTHORIZED:
+        _, frame = best_frames[decision.identity]
+        return handle_authorized(decision.identity, frame, decision.score, log_callback, **fields)
+
+    if decision.status == STATUS_INTRUDER:
+        _, frame = best_frames.get("Intruder") or next(iter(best_frames.values()))
+        return handle_intruder(frame, decision.score, log_callback, **fields)
 
     log_callback("⚠️ No conclusive prediction made.")
     return "none"
 
 
-def wait_and_run_pipeline(log_callback=print):
+def wait_and_run_pipeline(log_callback=print, should_stop=None):
+    """`should_stop()` is polled while waiting for the trigger (job cancellation / deadline)."""
     log_callback("🔌 Flask-triggered detection started...")
 
-    ser = wait_for_trigger()
-    if not ser:
-        log_callback("❌ Trigger not received. Exiting.")
-        return "no_trigger"
+    while not wait_for_trigger(timeout=1.0 if should_stop else None):
+        if should_stop is None or should_stop():
+            log_callback("❌ Trigger not received. Exiting.")
+            return "no_trigger"
 
     result = run_pipeline(log_callback=log_callback)
-    ser.close()
+    # The port stays open now, so the ESP32 is no longer reset between
+    # triggers; it has to be told to leave its post-motion pause
+    get_serial_service().send_resume()
     return result
 
+def run_zones(config_path=ZONES_CONFIG):
+    """Several doors at once: see src/zones.py for the config format."""
+    get_runtime()  # One model and matcher shared by every zone
+    get_location_provider()
+    runtime = ZoneRuntime(load_config(config_path),
+                          lambda frames, zone, log: run_pipeline(log_callback=log, frames=frames, zone=zone))
+    runtime.start()
+    try:
+        while True:
+            time.sleep(60)
+            for name, stats in runtime.status().items():
+                print(f"[INFO] Zone {name}: {stats}")
+    except KeyboardInterrupt:
+        print("\n🚪 Exiting via Ctrl+C")
+    finally:
+        runtime.stop()
+
 if __name__ == "__main__":
+    if "--zones" in sys.argv:
+        # python main.py --zones [config/zones.yaml]
+        args = sys.argv[sys.argv.index("--zones") + 1:]
+        run_zones(args[0] if args else ZONES_CONFIG)
+        sys.exit(0)
+
     print("🔌 Starting intruder detection system...")
+    get_camera_stream()  # Open the camera now so the ring buffer is warm before the first trigger
+    get_runtime()  # Load (or connect to) the model before the first trigger, not on it
+    get_location_provider()  # Warm the location cache in the background so alerts never wait on it
+
+    get_serial_service()  # Own the port from startup so no 'motion' line is missed
 
     while True:
-        ser = wait_for_trigger()
-        if not ser:
+        if not wait_for_trigger():
             print("👋 Exiting program.")
             break
 
         result = run_pipeline()
-        ser.close()
 
         if result in ["intruder", "authorized"]:
             print("✅ Detection handled. Exiting.")
             break
 
         print("📨 Sending 'resume' to ESP32...")
-        try:
-            ser = wait_for_trigger()
-            ser.write(b"resume\n")
-            time.sleep(0.5)
-            ser.close()
-        except Exception as e:
-            print(f"⚠️ Resume send failed: {e}")
+        get_serial_service().send_resume()
         print("\n🔁 Waiting for next trigger...\n")
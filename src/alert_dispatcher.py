@@ -0,0 +1,314 @@
+# src/alert_dispatcher.py
+
+import os
+import copy
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "100"))
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", "2"))
+ALERT_MAX_ATTEMPTS = 3
+ALERT_BACKOFF_S = 2.0        # Doubles after every failed attempt
+ALERT_DRAIN_TIMEOUT_S = 60.0  # How long exit waits for queued alerts
+DEAD_LETTER_PATH = os.getenv("ALERT_DEAD_LETTER_PATH", os.path.join("logs", "alerts_dead_letter.jsonl"))
+
+# Attempts are bounded by the clients' own socket timeouts (notifier.SMTP_TIMEOUT_S,
+# notifier_telegram.HTTP_TIMEOUT_S). A timeout after the request went out is
+# not retried: the server may have delivered it, and a retry could duplicate it.
+UNKNOWN_OUTCOME = "unknown outcome"
+
+# Coalescing: the first alert goes out at once; alerts arriving within the
+# next ALERT_COALESCE_WINDOW_S are sent as one digest when the window ends
+ALERT_COALESCE_WINDOW_S = float(os.getenv("ALERT_COALESCE_WINDOW_S", "60"))
+DIGEST_MAX_IMAGES = 5  # Telegram media groups take at most 10
+
+# Token buckets per channel: (messages per hour, burst)
+CHANNEL_RATE_LIMITS = {"email": (12, 3), "telegram": (60, 5)}
+
+
+class Alert:
+    def __init__(self, image_path, kind="intruder", score=None, quality=1.0, created=None):
+        self.image_path = image_path
+        self.kind = kind
+        self.score = score
+        self.quality = quality
+        self.created = created or datetime.now().isoformat(timespec="seconds")
+        self.image_paths = [image_path]
+        self.count = 1        # Events represented (more than one for a digest)
+        self.suppressed = 0   # Earlier events this channel dropped by rate limiting
+
+    @classmethod
+    def digest(cls, alerts, max_images=DIGEST_MAX_IMAGES):
+        """One alert standing for `alerts`, carrying the best-quality frames."""
+        best = sorted(alerts, key=lambda a: a.quality, reverse=True)[:max_images]
+        best.sort(key=lambda a: a.created)
+        digest = cls(best[0].image_path, kind="digest", score=min(a.score or 0.0 for a in alerts),
+                     created=alerts[0].created)
+        digest.image_paths = [a.image_path for a in best]
+        digest.count = sum(a.count for a in alerts)
+        digest.until = alerts[-1].created
+        return digest
+
+    def to_dict(self):
+        return {"image_path": self.image_path, "image_paths": self.image_paths, "kind": self.kind,
+                "score": self.score, "count": self.count, "created": self.created}
+
+    def __repr__(self):
+        return f"Alert({self.kind}, {self.image_path}, count={self.count})"
+
+
+class TokenBucket:
+    def __init__(self, per_hour, burst):
+        self.rate = per_hour / 3600.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+def default_channels():
+    """name -> callable(alert). Notifiers are imported here so importing this module stays cheap."""
+    from src.notifier import send_alert
+    from src.notifier_telegram import send_telegram_alert
+    from src.notifier_telegram import send_telegram_digest
+
+    def email(alert):
+        if alert.kind == "digest":
+            return send_alert(alert.image_path, extra_images=alert.image_paths[1:], body=_digest_text(alert))
+        return send_alert(alert.image_path, body=_suppressed_note(alert))
+
+    def telegram(alert):
+        if alert.kind == "digest":
+            return send_telegram_digest(alert.image_paths, _digest_text(alert))
+        # `progress` survives retries, so parts already sent (message, photo, pin) aren't sent again
+        return send_telegram_alert(alert.image_path, note=_suppressed_note(alert), progress=alert.progress)
+
+    return {"email": email, "telegram": telegram}
+
+
+def _suppressed_note(alert):
+    return f"{alert.suppressed} earlier alert(s) were rate-limited." if alert.suppressed else None
+
+
+def _digest_text(alert):
+    text = f"{alert.count} more intrusion event(s) between {alert.created} and {alert.until}."
+    note = _suppressed_note(alert)
+    return f"{text} {note}" if note else text
+
+
+def _outcome_unknown(error):
+    """
+    True for timeouts waiting on a reply (socket or requests read timeouts).
+    Connect timeouts are safe to retry: requests raises ConnectTimeout and
+    SMTPClient wraps connect/TLS/login failures in ConnectionError.
+    """
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if "ConnectTimeout" in names:
+        return False
+    return isinstance(error, TimeoutError) or "ReadTimeout" in names
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts off the detection path. dispatch() only enqueues onto a
+    bounded queue; worker threads fan each alert out to every channel at
+    once, retry failed channels with exponential backoff, and append
+    channels that still fail (or alerts that don't fit in the queue) to a
+    JSONL dead-letter file. A send that times out after reaching the
+    server is dead-lettered as "unknown outcome" rather than retried, so
+    retries never duplicate a delivered alert.
+
+    Repeated intrusions are coalesced: after an alert goes out, further ones
+    within `coalesce_window` seconds are held and sent as a single digest
+    when the window ends. Each channel also has a token bucket; sends it
+    refuses are counted as suppressed and mentioned in that channel's next
+    message.
+    """
+
+    def __init__(self, channels=None, workers=ALERT_WORKERS, queue_size=ALERT_QUEUE_SIZE,
+                 max_attempts=ALERT_MAX_ATTEMPTS, backoff=ALERT_BACKOFF_S,
+                 dead_letter_path=DEAD_LETTER_PATH,
+                 coalesce_window=ALERT_COALESCE_WINDOW_S, rate_limits=None):
+        self.channels = channels if channels is not None else default_channels()
+        self.coalesce_window = coalesce_window
+        limits = dict(CHANNEL_RATE_LIMITS, **(rate_limits or {}))
+        self._buckets = {name: TokenBucket(*limits[name]) for name in self.channels if limits.get(name)}
+        self._suppressed = {name: 0 for name in self.channels}
+        self._held = []
+        self._window_end = 0.0
+        self._window_lock = threading.Lock()
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.dead_letter_path = dead_letter_path
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dead_letter_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"queued": 0, "coalesced": 0, "digests": 0, "suppressed": 0,
+                      "delivered": 0, "retried": 0, "dead_lettered": 0}
+        # Plain daemon threads rather than executors: concurrent.futures refuses
+        # new work once the interpreter starts shutting down, which is exactly
+        # when the atexit drain still has alerts to deliver
+        self._workers = [threading.Thread(target=self._run, name=f"alert-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def dispatch(self, alert):
+        """
+        Queues `alert` (or holds it for the current digest) and returns
+        immediately. False if the queue was full (alert dead-lettered).
+        """
+        if self.coalesce_window > 0:
+            with self._window_lock:
+                now = time.monotonic()
+                if now < self._window_end:
+                    self._held.append(alert)
+                    self._count("coalesced")
+                    return True
+                self._open_window(now)
+        return self._enqueue(alert)
+
+    def _open_window(self, now):
+        self._window_end = now + self.coalesce_window
+        timer = threading.Timer(self.coalesce_window, self._close_window)
+        timer.daemon = True
+        timer.start()
+
+    def _close_window(self):
+        """Sends what was held as one digest; a digest opens a new window so a lingering intruder gets one per window."""
+        with self._window_lock:
+            held, self._held = self._held, []
+            if held:
+                self._open_window(time.monotonic())
+            else:
+                self._window_end = 0.0
+        if held:
+            self._count("digests")
+            self._enqueue(Alert.digest(held))
+
+    def _enqueue(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            print(f"[WARN] Alert queue full, dead-lettering {alert}")
+            self._dead_letter(alert, list(self.channels), "queue full")
+            return False
+        self._count("queued")
+        return True
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            try:
+                if alert is None:
+                    return
+                deliveries = [threading.Thread(target=self._deliver, args=(name, send, alert),
+                                               name=f"alert-{name}", daemon=True)
+                              for name, send in self.channels.items()]
+                for delivery in deliveries:
+                    delivery.start()
+                for delivery in deliveries:
+                    delivery.join()
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, name, send, alert):
+        bucket = self._buckets.get(name)
+        with self._stats_lock:
+            if bucket and not bucket.take():
+                self._suppressed[name] += alert.count
+                self.stats["suppressed"] += alert.count
+                print(f"[INFO] {name} rate limit reached, suppressed {alert} "
+                      f"({self._suppressed[name]} pending mention)")
+                return False
+            alert = copy.copy(alert)  # Per-channel view carrying this channel's suppressed count
+            alert.suppressed, self._suppressed[name] = self._suppressed[name], 0
+            alert.progress = set()
+
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                send(alert)  # Inline: the client's socket timeout bounds the attempt
+                self._count("delivered")
+                print(f"[INFO] {name} alert delivered in {time.perf_counter() - started:.2f}s (attempt {attempt})")
+                return True
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                if _outcome_unknown(e):
+                    print(f"[ERROR] {name} alert timed out waiting for the server ({error}); not retrying")
+                    self._dead_letter(alert, [name], f"{UNKNOWN_OUTCOME}: {error}")
+                    return False
+            if attempt < self.max_attempts:
+                delay = self.backoff * 2 ** (attempt - 1)
+                print(f"[WARN] {name} alert failed ({error}), retrying in {delay:.1f}s")
+                self._count("retried")
+                time.sleep(delay)
+
+        print(f"[ERROR] {name} alert failed after {self.max_attempts} attempt(s): {error}")
+        self._dead_letter(alert, [name], error)
+        return False
+
+    def _dead_letter(self, alert, channels, error):
+        record = dict(alert.to_dict(), channels=channels, error=error,
+                      failed_at=datetime.now().isoformat(timespec="seconds"))
+        with self._dead_letter_lock:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        self._count("dead_lettered", len(channels))
+
+    def drain(self, timeout=ALERT_DRAIN_TIMEOUT_S):
+        """Waits until every queued alert has been delivered or dead-lettered."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout=ALERT_DRAIN_TIMEOUT_S):
+        self._close_window()  # Don't sit on a digest at exit
+        drained = self.drain(timeout)
+        if not drained:
+            print(f"[WARN] Exiting with {self._queue.qsize()} alert(s) undelivered")
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    def status(self):
+        with self._stats_lock:
+            return dict(self.stats, pending=self._queue.unfinished_tasks, held=len(self._held),
+                        suppressed_by_channel=dict(self._suppressed))
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_alert_dispatcher():
+    """Shared dispatcher, started on first use; queued alerts are drained at exit."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher()
+            atexit.register(_dispatcher.close)
+        return _dispatcher
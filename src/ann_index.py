@@ -0,0 +1,168 @@
+# src/ann_index.py
+
+import os
+import zlib
+import numpy as np
+
+INDEX_VERSION = 1
+DEFAULT_NPROBE = 8
+KMEANS_ITERS = 12
+ASSIGN_CHUNK = 16384
+FULL_SCAN_FRACTION = 0.5  # Past this share of rows a single full scan is cheaper
+
+
+def index_path_for(embeddings_path):
+    """The persisted index lives next to the gallery it was built from."""
+    return os.path.splitext(embeddings_path)[0] + ".ivf.npz"
+
+
+def gallery_fingerprint(unit):
+    return zlib.crc32(np.ascontiguousarray(unit, dtype=np.float32)) & 0xFFFFFFFF
+
+
+def _assign(unit, centroids):
+    labels = np.empty(len(unit), dtype=np.int64)
+    for start in range(0, len(unit), ASSIGN_CHUNK):
+        chunk = unit[start:start + ASSIGN_CHUNK]
+        labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def _spherical_kmeans(unit, n_lists, iters, seed):
+    rng = np.random.default_rng(seed)
+    centroids = unit[rng.choice(len(unit), size=n_lists, replace=False)].copy()
+
+    for _ in range(iters):
+        labels = _assign(unit, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, unit)
+        counts = np.bincount(labels, minlength=n_lists)
+
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = unit[rng.choice(len(unit), size=int(empty.sum()), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1), 1e-12)[:, None]
+
+    return centroids.astype(np.float32), _assign(unit, centroids)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the L2-normalized gallery matrix.
+
+    Rows are partitioned with spherical k-means. A query scans the `nprobe`
+    closest partitions and re-ranks those rows exactly. Each partition also
+    stores its radius, which gives a lower bound on the cosine distance of
+    anything inside it; passing `exact_below` keeps probing partitions until
+    none can hold a row closer than min(best so far, exact_below). With
+    exact_below=THRESHOLD, every accept/reject decision matches brute force.
+    """
+
+    def __init__(self, centroids, order, list_offsets, radii, n_rows, fingerprint, nprobe=DEFAULT_NPROBE):
+        self.centroids = centroids
+        self.order = order
+        self.list_offsets = list_offsets
+        self.radii = radii
+        self.n_rows = int(n_rows)
+        self.fingerprint = int(fingerprint)
+        self.nprobe = nprobe
+        self.vectors = None  # gallery rows regrouped list by list, see bind()
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, unit, n_lists=None, iters=KMEANS_ITERS, seed=0, nprobe=DEFAULT_NPROBE):
+        n_rows = len(unit)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        centroids, labels = _spherical_kmeans(unit, n_lists, iters, seed)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        spread = np.linalg.norm(unit - centroids[labels], axis=1)
+        radii = np.zeros(n_lists, dtype=np.float32)
+        np.maximum.at(radii, labels, spread.astype(np.float32))
+
+        index = cls(centroids, order, list_offsets, radii, n_rows, gallery_fingerprint(unit), nprobe)
+        index.bind(unit)
+        return index
+
+    def bind(self, unit):
+        """Keeps a list-contiguous copy of the gallery so each list is one slice."""
+        self.vectors = np.ascontiguousarray(unit[self.order], dtype=np.float32)
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.int64(INDEX_VERSION),
+                centroids=self.centroids,
+                order=self.order,
+                list_offsets=self.list_offsets,
+                radii=self.radii,
+                n_rows=np.int64(self.n_rows),
+                fingerprint=np.int64(self.fingerprint),
+            )
+        os.replace(tmp_path, path)
+        print(f"[INFO] Saved ANN index ({self.n_lists} lists) to {path}")
+
+    @classmethod
+    def load(cls, path, nprobe=DEFAULT_NPROBE):
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"Unsupported ANN index version in {path}")
+            return cls(
+                data["centroids"], data["order"], data["list_offsets"], data["radii"],
+                int(data["n_rows"]), int(data["fingerprint"]), nprobe,
+            )
+
+    def matches(self, unit):
+        return self.n_rows == len(unit) and self.fingerprint == gallery_fingerprint(unit)
+
+    def _scan(self, lists, q_unit):
+        sizes = self.list_offsets[lists + 1] - self.list_offsets[lists]
+        if sizes.sum() >= FULL_SCAN_FRACTION * self.n_rows:
+            keep = np.zeros(self.n_lists, dtype=bool)
+            keep[lists] = True
+            mask = np.repeat(keep, np.diff(self.list_offsets))
+            return self.order[mask], (1.0 - self.vectors @ q_unit)[mask]
+
+        rows, distances = [], []
+        for l in lists:
+            start, end = self.list_offsets[l], self.list_offsets[l + 1]
+            if end > start:
+                rows.append(self.order[start:end])
+                distances.append(1.0 - self.vectors[start:end] @ q_unit)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(distances)
+
+    def search(self, q_unit, nprobe=None, exact_below=None):
+        """
+        Returns (rows, distances): the candidate gallery rows scanned for one
+        normalized probe and their exact cosine distances.
+        """
+        nprobe = max(1, min(nprobe or self.nprobe, self.n_lists))
+        centroid_dist = np.linalg.norm(self.centroids - q_unit[None, :], axis=1)
+        ranked = np.argsort(centroid_dist)
+
+        probed = ranked[:nprobe]
+        if exact_below is not None and nprobe < self.n_lists:
+            rows, distances = self._scan(probed, q_unit)
+            best = float(distances.min()) if len(distances) else np.inf
+            rest = ranked[nprobe:]
+            # For unit vectors cosine distance = ||q - x||^2 / 2, and
+            # ||q - x|| >= ||q - c|| - radius for every x in the list.
+            lower = np.maximum(centroid_dist[rest] - self.radii[rest], 0.0) ** 2 / 2.0 - 1e-6
+            extra = rest[lower < min(best, exact_below)]
+            if len(extra):
+                return self._scan(np.concatenate([probed, extra]), q_unit)
+            return rows, distances
+
+        return self._scan(probed, q_unit)
@@ -1,36 +1,242 @@
 import cv2
 import os
-from datetime import datetime
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 import time
 
+import numpy as np
+
 CAPTURED_DIR = os.path.join("data", "captured")
 
-def capture_images(num_images=5, delay=2):
-    if not os.path.exists(CAPTURED_DIR):
-        os.makedirs(CAPTURED_DIR)
+# Burst mode (persistent camera + ring buffer)
+CAMERA_SOURCE = os.getenv("CAMERA_SOURCE", "0")  # Device index or stream URL
+RING_SIZE = int(os.getenv("BURST_RING_SIZE", "60"))  # ~2 s at 30 FPS
+BURST_PRE_TRIGGER_S = 1.0   # How far back before the trigger frames may be taken
+BURST_POST_TRIGGER_S = 0.5  # How long to keep collecting after the trigger
+BURST_MIN_GAP_S = 0.1       # Minimum spacing between selected frames (avoids near-duplicates)
+BURST_SELECTION = "sharpness"  # "sharpness" or "recent"
+SHARPNESS_WIDTH = 160       # Frames are downscaled to this width before scoring sharpness
+REOPEN_DELAY_S = 2.0
+
+
+def parse_source(source):
+    """Device indices come from config as strings; URLs pass through."""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+def sharpness(image, width=SHARPNESS_WIDTH):
+    """Variance of the Laplacian on a small grayscale copy; higher is sharper."""
+    scale = width / image.shape[1]
+    small = cv2.resize(image, (width, max(1, int(image.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+@dataclass
+class Frame:
+    """A captured frame kept in memory (BGR ndarray) until something needs it on disk."""
+    image: np.ndarray
+    timestamp: datetime
+    index: int = 0
+    source: object = 0
+    metadata: dict = field(default_factory=dict)
+    path: str = None  # Set once the frame has been persisted
+
+    @property
+    def filename(self):
+        return f"{self.timestamp.strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+
+    def __str__(self):
+        return self.path or f"<frame {self.index} @ {self.timestamp.strftime('%H:%M:%S.%f')}>"
+
 
-    cap = cv2.VideoCapture(0)
+def save_frame(frame, directory=CAPTURED_DIR):
+    """Encodes a frame as JPEG under `directory` and records the path on it."""
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, frame.filename)
+    if not cv2.imwrite(file_path, frame.image):
+        raise IOError(f"Failed to write {file_path}")
+    frame.path = file_path
+    return file_path
+
+
+def capture_frames(num_images=5, delay=2, source=0):
+    """Yields in-memory Frames straight from the camera; nothing is written to disk."""
+    cap = cv2.VideoCapture(source)
     if not cap.isOpened():
         print("❌ Failed to open camera.")
-        return []
+        return
 
     print("📷 Camera opened successfully.")
 
+    try:
+        for i in range(num_images):
+            ret, image = cap.read()
+            if not ret:
+                print(f"⚠️ Failed to capture image {i + 1}")
+                continue
+
+            print(f"✅ Frame {i + 1} captured")
+            yield Frame(image=image, timestamp=datetime.now(), index=i, source=source)
+
+            if i < num_images - 1:
+                time.sleep(delay)
+    finally:
+        cap.release()
+
+
+def capture_images(num_images=5, delay=2):
+    """Legacy path-based capture: every frame is written to CAPTURED_DIR."""
     captured_files = []
-    for i in range(num_images):
-        ret, frame = cap.read()
-        if not ret:
-            print(f"⚠️ Failed to capture image {i + 1}")
-            continue
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = f"{timestamp}.jpg"
-        file_path = os.path.join(CAPTURED_DIR, filename)
-        cv2.imwrite(file_path, frame)
-        print(f"✅ Image {i + 1} saved: {file_path}")
+    for frame in capture_frames(num_images=num_images, delay=delay):
+        file_path = save_frame(frame)
+        print(f"✅ Image {frame.index + 1} saved: {file_path}")
         captured_files.append(file_path)
+    return captured_files
 
-        time.sleep(delay)
 
-    cap.release()
-    return captured_files
+class CameraStream:
+    """
+    Keeps the camera open on a background thread and holds the most recent
+    frames in a ring buffer, so a trigger can be served from frames that are
+    already in memory, including ones grabbed just before it fired.
+    """
+
+    def __init__(self, source=CAMERA_SOURCE, ring_size=RING_SIZE):
+        self.source = parse_source(source)
+        self.ring = deque(maxlen=ring_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._count = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="camera-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            cap = cv2.VideoCapture(self.source)
+            if not cap.isOpened():
+                print(f"❌ Failed to open camera {self.source}, retrying in {REOPEN_DELAY_S:.0f}s")
+                self._stop.wait(REOPEN_DELAY_S)
+                continue
+
+            print(f"📷 Camera stream {self.source} opened.")
+            while not self._stop.is_set():
+                ret, image = cap.read()
+                if not ret:
+                    print("⚠️ Camera read failed, reopening...")
+                    break
+                frame = Frame(image=image, timestamp=datetime.now(), index=self._count, source=self.source)
+                frame.metadata["sharpness"] = sharpness(image)
+                with self._cond:
+                    self.ring.append(frame)
+                    self._count += 1
+                    self._cond.notify_all()
+            cap.release()
+
+    def wait_until(self, deadline):
+        """Blocks until a frame newer than `deadline` is buffered (or the stream stops)."""
+        with self._cond:
+            while not self._stop.is_set():
+                if self.ring and self.ring[-1].timestamp >= deadline:
+                    return True
+                remaining = (deadline - datetime.now()).total_seconds()
+                # Don't hang if the camera stalls; give it one extra window
+                if remaining < -max(BURST_POST_TRIGGER_S, 1.0):
+                    return False
+                self._cond.wait(timeout=max(remaining, 0.05))
+        return False
+
+    def window(self, start, end):
+        with self._cond:
+            return [f for f in self.ring if start <= f.timestamp <= end]
+
+    def burst(self, num_images=5, pre_s=BURST_PRE_TRIGGER_S, post_s=BURST_POST_TRIGGER_S,
+              min_gap_s=BURST_MIN_GAP_S, selection=BURST_SELECTION, trigger_time=None):
+        """
+        Returns up to `num_images` frames from [trigger - pre_s, trigger + post_s],
+        picked by `selection` and ordered by capture time.
+        """
+        trigger_time = trigger_time or datetime.now()
+        end = trigger_time + timedelta(seconds=post_s)
+        self.wait_until(end)
+        candidates = self.window(trigger_time - timedelta(seconds=pre_s), end)
+        return select_frames(candidates, num_images, min_gap_s, selection)
+
+    def stream_burst(self, num_images=5, pre_s=BURST_PRE_TRIGGER_S, post_s=BURST_POST_TRIGGER_S,
+                     selection=BURST_SELECTION, trigger_time=None, stop_event=None):
+        """
+        Streaming variant of burst(): the window is split into `num_images`
+        equal slots and the best frame of each slot is yielded as soon as the
+        slot has closed. Slots before the trigger come straight from the ring,
+        so the first frame is available without waiting on the camera.
+        """
+        trigger_time = trigger_time or datetime.now()
+        start = trigger_time - timedelta(seconds=pre_s)
+        slot = timedelta(seconds=(pre_s + post_s) / max(num_images, 1))
+
+        for i in range(num_images):
+            if stop_event is not None and stop_event.is_set():
+                return
+            slot_start, slot_end = start + i * slot, start + (i + 1) * slot
+            if slot_end > datetime.now():
+                self.wait_until(slot_end)
+            chosen = select_frames(self.window(slot_start, slot_end), 1, 0.0, selection)
+            if chosen:
+                yield chosen[0]
+
+
+def select_frames(candidates, num_images, min_gap_s=BURST_MIN_GAP_S, selection=BURST_SELECTION):
+    if selection == "sharpness":
+        ranked = sorted(candidates, key=lambda f: f.metadata.get("sharpness", 0.0), reverse=True)
+    else:
+        ranked = sorted(candidates, key=lambda f: f.timestamp, reverse=True)
+
+    gap = timedelta(seconds=min_gap_s)
+    chosen = []
+    for frame in ranked:
+        if all(abs(frame.timestamp - other.timestamp) >= gap for other in chosen):
+            chosen.append(frame)
+            if len(chosen) == num_images:
+                break
+    return sorted(chosen, key=lambda f: f.timestamp)
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def get_camera_stream():
+    """Shared, lazily started camera stream."""
+    global _stream
+    with _stream_lock:
+        if _stream is None:
+            _stream = CameraStream().start()
+        return _stream
+
+
+def stream_frames(num_images=5, **kwargs):
+    """Streaming burst from the shared stream; see CameraStream.stream_burst."""
+    return get_camera_stream().stream_burst(num_images, **kwargs)
+
+
+def burst_frames(num_images=5, **kwargs):
+    """Burst capture from the shared stream; see CameraStream.burst."""
+    frames = get_camera_stream().burst(num_images, **kwargs)
+    print(f"📸 Burst selected {len(frames)} frame(s) from the ring buffer.")
+    return frames
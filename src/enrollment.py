@@ -0,0 +1,116 @@
+# src/enrollment.py
+#
+# Incremental enrollment into the memory-mapped gallery (src/gallery_store.py).
+#
+#   python -m src.enrollment enroll <name> img1.jpg img2.jpg ...
+#   python -m src.enrollment capture <name> [--count 5]
+#   python -m src.enrollment remove <name>
+#   python -m src.enrollment list
+
+import os
+import argparse
+
+from src.gallery_store import GalleryStore, gallery_exists, convert_pickle
+from src.predict_with_embed import EMBEDDINGS_PATH, load_model, decode_images, get_embeddings_batch
+
+ENROLL_MIN_CONFIDENCE = 0.9  # Detector confidence a sample needs; the detector returns the whole frame at 0.0 when it finds no face
+
+_model = None
+
+
+def _get_model():
+    global _model
+    if _model is None:
+        _model = load_model()
+    return _model
+
+
+def _store(path):
+    if not gallery_exists(path) and os.path.exists(path):
+        # First write against a legacy pickle: convert it so it can be appended to
+        convert_pickle(path)
+    return GalleryStore(path)
+
+
+def enroll(identity, frames, model=None, path=EMBEDDINGS_PATH):
+    """
+    Embeds `frames` (Frames, BGR arrays or image paths) and appends the
+    resulting vectors for `identity`. Frames without a detectable face are
+    skipped. Returns the number of vectors added; raises ValueError if no
+    frame had one.
+    """
+    images = [f if hasattr(f, "shape") else None for f in frames]
+    to_decode = [f for f, img in zip(frames, images) if img is None]
+    decoded = iter(decode_images(to_decode))
+    images = [img if img is not None else next(decoded) for img in images]
+
+    confidences = []
+    embeddings = get_embeddings_batch(model or _get_model(), images, confidences=confidences)
+    embeddings = [e for e, conf in zip(embeddings, confidences)
+                  if e is not None and conf >= ENROLL_MIN_CONFIDENCE]
+    skipped = len(images) - len(embeddings)
+    if skipped:
+        print(f"[WARN] Skipped {skipped} frame(s) without a clear face (confidence < {ENROLL_MIN_CONFIDENCE}).")
+    if not embeddings:
+        raise ValueError(f"No usable face found for {identity}; nothing enrolled.")
+
+    generation = _store(path).append(identity, embeddings)
+    print(f"[INFO] Enrolled {identity}: {len(embeddings)} sample(s) (gallery generation {generation}).")
+    return len(embeddings)
+
+
+def remove(identity, path=EMBEDDINGS_PATH):
+    removed = _store(path).remove(identity)
+    if removed:
+        print(f"[INFO] Removed {identity} ({removed} sample(s)).")
+    else:
+        print(f"[WARN] {identity} is not enrolled.")
+    return removed
+
+
+def list_identities(path=EMBEDDINGS_PATH):
+    """Returns {identity: sample count} for every enrolled person."""
+    if not gallery_exists(path):
+        if not os.path.exists(path):
+            return {}
+        _store(path)
+    return GalleryStore(path).identities()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the authorized face gallery.")
+    parser.add_argument("--gallery", default=EMBEDDINGS_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enroll = sub.add_parser("enroll", help="Enroll from image files")
+    p_enroll.add_argument("identity")
+    p_enroll.add_argument("images", nargs="+")
+
+    p_capture = sub.add_parser("capture", help="Enroll from the webcam")
+    p_capture.add_argument("identity")
+    p_capture.add_argument("--count", type=int, default=5)
+
+    p_remove = sub.add_parser("remove")
+    p_remove.add_argument("identity")
+
+    sub.add_parser("list")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "enroll":
+            enroll(args.identity, args.images, path=args.gallery)
+        elif args.command == "capture":
+            from src.camera import capture_frames
+            frames = [f.image for f in capture_frames(num_images=args.count, delay=0.5)]
+            enroll(args.identity, frames, path=args.gallery)
+    except ValueError as e:
+        parser.exit(1, f"❌ {e}\n")
+    if args.command == "remove":
+        remove(args.identity, path=args.gallery)
+    elif args.command == "list":
+        for identity, count in sorted(list_identities(args.gallery).items()):
+            print(f"- {identity}: {count} sample(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# src/event_log.py
+#
+# Structured detection event log. Events are JSON Lines appended by a single
+# buffered writer thread to logs/events/detections.jsonl. The active segment
+# is rotated when the day changes or it grows past EVENT_LOG_MAX_BYTES; rotated
+# segments are gzipped and named after the first/last event they hold, so a
+# time-range scan only opens the segments that overlap it.
+#
+#   python -m src.event_log scan [--start ...] [--end ...] [--status ALERT]
+#   python -m src.event_log import logs/detections.log   # one-off, legacy text log
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.log_reader import LogReader, parse_line
+
+EVENTS_DIR = os.getenv("EVENT_LOG_DIR", os.path.join("logs", "events"))
+ACTIVE_NAME = "detections.jsonl"
+LOCK_NAME = ".detections.lock"
+EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+FLUSH_INTERVAL_S = 0.5
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%S"
+SEGMENT_PATTERN = re.compile(r"^detections-(\d{8}T\d{6})-(\d{8}T\d{6})(?:-\d+)?\.jsonl(\.gz)?$")
+
+
+def _segment_time(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).strftime(SEGMENT_TIME_FORMAT)
+
+
+def _from_segment_time(value):
+    return datetime.strptime(value, SEGMENT_TIME_FORMAT).strftime(TIMESTAMP_FORMAT)
+
+
+def _compress(path):
+    tmp = path + ".gz.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, path + ".gz")
+    os.remove(path)
+
+
+@contextmanager
+def _locked(path):
+    """Exclusive advisory lock on `path`, shared by every process writing the event log."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 s of contention; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EventLogger:
+    """
+    log() only enqueues; the writer thread appends whole batches and
+    handles rotation and compression, so callers on the detection path
+    never touch the file.
+
+    More than one process may run a logger (main.py, the Flask backend, the
+    zone runtime): every batch, rotation included, happens under a lock
+    file, and the active segment is only open while a batch is written, so
+    another process can always rename it (which Windows refuses for open
+    files).
+    """
+
+    def __init__(self, directory=EVENTS_DIR, max_bytes=EVENT_LOG_MAX_BYTES, flush_interval=FLUSH_INTERVAL_S):
+        self.directory = directory
+        self.path = os.path.join(directory, ACTIVE_NAME)
+        self.lock_path = os.path.join(directory, LOCK_NAME)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._first = self._last = None  # Timestamps bounding the active segment
+        self._size = 0
+        self._known = None  # (inode, size) of the active segment after our last write
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    def log(self, status, image_path, **fields):
+        """Queues one event; extra keyword fields (identity, score, ...) are stored as-is."""
+        event = {"timestamp": time.strftime(TIMESTAMP_FORMAT), "status": status, "image_path": image_path}
+        event.update(fields)
+        self._queue.put(event)
+        return event
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    # ---- writer thread (all of it runs under the lock file) ----
+
+    def _sync(self):
+        """Refreshes what we know about the active segment unless it is exactly as we left it."""
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            self._first = self._last = None
+            self._size, self._known = 0, None
+            return
+        if (info.st_ino, info.st_size) == self._known:
+            return
+        # Another process wrote to or rotated the segment since our last batch
+        self._first = self._last = None
+        self._size = info.st_size
+        if info.st_size:
+            with open(self.path, "rb") as f:
+                first = parse_line(f.readline().decode("utf-8", errors="replace"))
+            latest = LogReader(self.path).latest()
+            self._first = first[0] if first else None
+            self._last = latest["timestamp"] if latest else None
+
+    def _append(self, lines):
+        if lines:
+            with open(self.path, "ab") as f:
+                f.write(b"".join(lines))
+
+    def _rotate(self):
+        if self._first:
+            base = f"detections-{_segment_time(self._first)}-{_segment_time(self._last)}"
+            name, n = base + ".jsonl", 1
+            while os.path.exists(os.path.join(self.directory, name)) or \
+                    os.path.exists(os.path.join(self.directory, name + ".gz")):
+                name, n = f"{base}-{n}.jsonl", n + 1
+            rotated = os.path.join(self.directory, name)
+            os.replace(self.path, rotated)
+            try:
+                _compress(rotated)
+            except OSError as e:
+                print(f"[WARN] Could not compress {rotated}: {e}")  # Readers handle plain segments too
+        self._first = self._last = None
+        self._size = 0
+
+    def _needs_rotation(self, event, size):
+        if self._first is None:
+            return False
+        return event["timestamp"][:10] != self._first[:10] or self._size + size > self.max_bytes
+
+    def _write(self, batch):
+        with _locked(self.lock_path):
+            self._sync()
+            lines = []
+            for event in batch:
+                line = (json.dumps(event, default=str) + "\n").encode("utf-8")
+                if self._needs_rotation(event, len(line)):
+                    self._append(lines)
+                    lines = []
+                    self._rotate()
+                lines.append(line)
+                self._size += len(line)  # Counts pending lines, so one large batch can't overshoot max_bytes
+                self._first = self._first or event["timestamp"]
+                self._last = event["timestamp"]
+            self._append(lines)
+            info = os.stat(self.path)
+            self._known = (info.st_ino, info.st_size)
+
+    def _compress_leftovers(self):
+        for entry in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(entry)
+            if match and not match.group(3):
+                _compress(os.path.join(self.directory, entry))
+
+    def _run(self):
+        try:
+            with _locked(self.lock_path):
+                self._compress_leftovers()
+        except OSError as e:
+            print(f"[WARN] Event log: {e}")
+
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"[ERROR] Event log write failed, {len(batch)} event(s) lost: {e}")
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_event_logger():
+    """Shared logger, started on first use and drained at exit."""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = EventLogger()
+            atexit.register(_logger.close)
+        return _logger
+
+
+# ---- readers ----
+
+def list_segments(directory=EVENTS_DIR):
+    """[(first_timestamp, last_timestamp, path)] oldest first; the active segment comes last."""
+    segments = []
+    if not os.path.isdir(directory):
+        return segments
+    for entry in os.listdir(directory):
+        match = SEGMENT_PATTERN.match(entry)
+        if match:
+            segments.append((_from_segment_time(match.group(1)), _from_segment_time(match.group(2)),
+                             os.path.join(directory, entry)))
+    segments.sort()
+
+    active = os.path.join(directory, ACTIVE_NAME)
+    if os.path.exists(active) and os.path.getsize(active):
+        with open(active, "rb") as f:
+            first = parse_line(f.readline().decode("utf-8", errors="replace"))
+        if first:
+            segments.append((first[0], "9999-12-31 23:59:59", active))  # Still growing
+    return segments
+
+
+def _open_segment(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+
+def read_events(start=None, end=None, status=None, directory=EVENTS_DIR):
+    """
+    Yields events with start <= timestamp < end (strings or datetimes),
+    oldest first. Segments outside the range are never opened.
+    """
+    start = str(start) if start else None
+    end = str(end) if end else None
+    for first, last, path in list_segments(directory):
+        if (end and first >= end) or (start and last < start):
+            continue
+        for event in _scan(path, status):
+            ts = event.get("timestamp", "")
+            if (start and ts < start) or (end and ts >= end):
+                continue
+            yield event
+
+
+def event_days(directory=EVENTS_DIR):
+    """Days (YYYY-MM-DD) with at least one segment, newest first."""
+    active = os.path.join(directory, ACTIVE_NAME)
+    days = set(LogReader(active).days())
+    for first, last, path in list_segments(directory):
+        if path != active:
+            days.update((first[:10], last[:10]))
+    return sorted(days, reverse=True)
+
+
+def latest_event(status=None, directory=EVENTS_DIR):
+    """Most recent event (optionally of `status`): tail of the active segment, then older segments."""
+    active = os.path.join(directory, ACTIVE_NAME)
+    latest = LogReader(active).latest(status)
+    if latest:
+        return latest
+    for first, last, path in reversed(list_segments(directory)):
+        if path == active:
+            continue
+        found = None
+        for event in _scan(path, status):
+            found = event
+        if found:
+            return found
+    return None
+
+
+def _scan(path, status):
+    with _open_segment(path) as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue  # Torn final line of a crashed writer
+            if status is None or event.get("status") == status:
+                yield event
+
+
+def import_legacy(log_file, directory=EVENTS_DIR):
+    """Converts a text detections.log into rotated, compressed segments (one per day)."""
+    by_day = {}
+    with open(log_file, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parsed = parse_line(line)
+            if parsed:
+                timestamp, status, image_path = parsed
+                by_day.setdefault(timestamp[:10], []).append(
+                    {"timestamp": timestamp, "status": status, "image_path": image_path, "source": "legacy"})
+
+    os.makedirs(directory, exist_ok=True)
+    for day, events in sorted(by_day.items()):
+        events.sort(key=lambda e: e["timestamp"])
+        name = f"detections-{_segment_time(events[0]['timestamp'])}-{_segment_time(events[-1]['timestamp'])}-0.jsonl"
+        path = os.path.join(directory, name)
+        if os.path.exists(path + ".gz"):
+            continue  # Already imported
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(e) + "\n" for e in events)
+        _compress(path)
+    return sum(len(v) for v in by_day.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detection event log tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    scan = sub.add_parser("scan", help="Print events in a time range")
+    scan.add_argument("--start")
+    scan.add_argument("--end")
+    scan.add_argument("--status")
+    legacy = sub.add_parser("import", help="Convert a legacy text log into segments")
+    legacy.add_argument("log_file")
+    args = parser.parse_args()
+
+    if args.command == "scan":
+        for event in read_events(args.start, args.end, args.status):
+            print(json.dumps(event))
+    else:
+        count = import_legacy(args.log_file)
+        print(f"✅ Imported {count} event(s) from {args.log_file} into {EVENTS_DIR}")
@@ -0,0 +1,65 @@
+# src/evidence.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.camera import CAPTURED_DIR, save_frame
+
+# Which frames get written to CAPTURED_DIR:
+#   "alerts" - only frames used as intruder evidence
+#   "all"    - every verified frame (useful when auditing the recognizer)
+RETENTION_POLICY = os.getenv("RETENTION_POLICY", "alerts")
+
+REASON_ALERT = "alert"
+REASON_AUTHORIZED = "authorized"
+REASON_CAPTURE = "capture"
+
+
+class EvidenceWriter:
+    """
+    Persists frames to disk on a background thread so JPEG encoding and file
+    I/O stay off the capture/recognition path.
+    """
+
+    def __init__(self, directory=CAPTURED_DIR, policy=RETENTION_POLICY):
+        self.directory = directory
+        self.policy = policy
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="evidence-writer")
+
+    def should_retain(self, reason):
+        return reason == REASON_ALERT or self.policy == "all"
+
+    def path_for(self, frame):
+        return frame.path or os.path.join(self.directory, frame.filename)
+
+    def save(self, frame, reason=REASON_CAPTURE):
+        """
+        Queues `frame` for writing if the retention policy keeps it.
+        Returns a Future resolving to the file path, or None if the frame is dropped.
+        """
+        if not self.should_retain(reason):
+            return None
+        return self._executor.submit(self._write, frame)
+
+    def _write(self, frame):
+        if frame.path:
+            return frame.path
+        path = save_frame(frame, self.directory)
+        print(f"💾 Evidence saved: {path}")
+        return path
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_evidence_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = EvidenceWriter()
+        return _writer
@@ -0,0 +1,179 @@
+# src/fusion.py
+
+import numpy as np
+
+# Defaults (cosine distance, same scale as predict_with_embed.THRESHOLD)
+THRESHOLD = 0.4
+FUSION_POLICY = "median"   # "median", "mean" or "vote"
+MIN_FRAMES = 2             # Scored frames needed before any decision
+MIN_VOTE_SHARE = 0.6       # "vote" policy: weighted share the winner needs
+MIN_AUTH_SHARE = 0.5       # Authorizing needs strictly more than this share of the frame weight
+QUALITY_WEIGHTING = True   # Weight frames by detector confidence and sharpness
+SHARPNESS_REF = 100.0      # Laplacian variance treated as "fully sharp"
+MAX_DISTANCE = 2.0         # Largest possible cosine distance
+
+INTRUDER = "Intruder"
+UNKNOWN = "Unknown"
+
+STATUS_AUTHORIZED = "authorized"
+STATUS_INTRUDER = "intruder"
+STATUS_PENDING = "none"
+
+
+def frame_quality(frame):
+    """Quality weight in (0, 1] from the face detector confidence and frame sharpness."""
+    metadata = getattr(frame, "metadata", None) or {}
+    confidence = metadata.get("face_confidence", 1.0) or 0.0
+    sharp = metadata.get("sharpness")
+    sharp_factor = 1.0 if sharp is None else min(1.0, sharp / SHARPNESS_REF)
+    return max(1e-3, float(confidence) * sharp_factor)
+
+
+def _weighted_median(values, weights):
+    """Upper weighted median: an even split resolves to the larger distance, i.e. towards rejection."""
+    order = np.argsort(values)
+    values, weights = values[order], weights[order]
+    cumulative = np.cumsum(weights)
+    half = cumulative[-1] / 2.0
+    index = np.searchsorted(cumulative, half * (1 + 1e-9), side="right")  # Float slack: near-ties count as ties
+    return float(values[min(index, len(values) - 1)])
+
+
+class FusedDecision:
+    def __init__(self, status, identity=None, score=None, share=0.0, frames=0):
+        self.status = status
+        self.identity = identity
+        self.score = score
+        self.share = share
+        self.frames = frames
+
+    def __eq__(self, other):
+        return (self.status, self.identity) == (other.status, other.identity)
+
+    def __repr__(self):
+        score = "n/a" if self.score is None else f"{self.score:.4f}"
+        return f"FusedDecision({self.status}, {self.identity}, score={score}, share={self.share:.2f}, frames={self.frames})"
+
+
+class EvidenceFusion:
+    """
+    Fuses per-frame (name, score) results from verify_captured_images /
+    verify_stream into one authorization decision.
+
+    Frames can be added one at a time; is_stable() tells the caller when
+    no number of remaining frames could change the decision, so capture can
+    stop early.
+
+    For an identity, frames matched to it contribute their distance. Frames
+    matched elsewhere, or to nobody, contribute max(score, threshold): they
+    are at least that far from it as far as this frame can tell.
+    """
+
+    def __init__(self, policy=FUSION_POLICY, threshold=THRESHOLD, min_frames=MIN_FRAMES,
+                 min_vote_share=MIN_VOTE_SHARE, quality_weighting=QUALITY_WEIGHTING,
+                 min_auth_share=MIN_AUTH_SHARE):
+        if policy not in ("median", "mean", "vote"):
+            raise ValueError(f"Unknown fusion policy: {policy}")
+        self.policy = policy
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.min_vote_share = min_vote_share
+        self.min_auth_share = min_auth_share
+        self.quality_weighting = quality_weighting
+        self.names = []
+        self.scores = []
+        self.weights = []
+        self.unscored = 0
+
+    def add(self, name, score, quality=1.0):
+        """Adds one frame result and returns the updated decision."""
+        if score is None:
+            self.unscored += 1
+        else:
+            self.names.append(name)
+            self.scores.append(float(score))
+            self.weights.append(float(quality) if self.quality_weighting else 1.0)
+        return self.decision()
+
+    def _fuse(self, identity, names, scores, weights):
+        own = names == identity
+        distances = np.where(own, scores, np.maximum(scores, self.threshold))
+        if self.policy == "mean":
+            return float(np.average(distances, weights=weights))
+        return _weighted_median(distances, weights)
+
+    def _decide(self, names, scores, weights):
+        frames = len(scores)
+        if frames < self.min_frames:
+            return FusedDecision(STATUS_PENDING, frames=frames)
+
+        names = np.asarray(names, dtype=object)
+        scores = np.asarray(scores, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        total = weights.sum()
+
+        identities = [n for n in dict.fromkeys(names) if n not in (INTRUDER, UNKNOWN)]
+        fused = {identity: self._fuse(identity, names, scores, weights) for identity in identities}
+        shares = {n: float(weights[names == n].sum() / total) for n in dict.fromkeys(names)}
+
+        if self.policy == "vote":
+            leader = max(shares, key=shares.get)
+            share = shares[leader]
+            if share < self.min_vote_share or (leader != INTRUDER and share <= self.min_auth_share):
+                identity = None if leader == INTRUDER else leader
+                return FusedDecision(STATUS_PENDING, identity, fused.get(leader), share, frames)
+            if leader == INTRUDER:
+                return FusedDecision(STATUS_INTRUDER, None, _weighted_median(scores, weights), share, frames)
+            return FusedDecision(STATUS_AUTHORIZED, leader, fused[leader], share, frames)
+
+        if fused:
+            best = min(fused, key=fused.get)
+            if fused[best] < self.threshold and shares.get(best, 0.0) > self.min_auth_share:
+                return FusedDecision(STATUS_AUTHORIZED, best, fused[best], shares.get(best, 0.0), frames)
+            return FusedDecision(STATUS_INTRUDER, None, fused[best], shares.get(INTRUDER, 0.0), frames)
+
+        score = float(np.average(scores, weights=weights)) if self.policy == "mean" else _weighted_median(scores, weights)
+        return FusedDecision(STATUS_INTRUDER, None, score, shares.get(INTRUDER, 0.0), frames)
+
+    def decision(self):
+        return self._decide(self.names, self.scores, self.weights)
+
+    def is_stable(self, remaining):
+        """
+        True when the current decision holds even if all `remaining` frames
+        (each at full weight) came out as badly as possible for it.
+        """
+        current = self.decision()
+        if current.status == STATUS_PENDING:
+            return False
+        if remaining <= 0:
+            return True
+
+        if current.status == STATUS_AUTHORIZED:
+            # Worst cases: every remaining frame is a clear stranger, or a
+            # perfect match for somebody else
+            scenarios = [([INTRUDER] * remaining, [MAX_DISTANCE] * remaining),
+                         (["__other__"] * remaining, [0.0] * remaining)]
+        else:
+            # Worst case: every remaining frame is a perfect match for the closest identity
+            rival = self._closest_identity() or "__any__"
+            scenarios = [([rival] * remaining, [0.0] * remaining)]
+
+        for worst_names, worst_scores in scenarios:
+            worst = self._decide(self.names + worst_names, self.scores + worst_scores,
+                                 self.weights + [1.0] * remaining)
+            if worst != current:
+                return False
+        return True
+
+    def _closest_identity(self):
+        candidates = [(s, n) for n, s in zip(self.names, self.scores) if n not in (INTRUDER, UNKNOWN)]
+        return min(candidates)[1] if candidates else None
+
+
+def fuse_results(results, **kwargs):
+    """One-shot fusion over a verify_captured_images result list."""
+    fusion = EvidenceFusion(**kwargs)
+    for name, capture, score in results:
+        fusion.add(name, score, frame_quality(capture))
+    return fusion.decision()
@@ -0,0 +1,341 @@
+# src/gallery_store.py
+#
+# Memory-mapped gallery format for authorized face embeddings.
+#
+#   <base>.vec       header + float32 rows (L2-normalized embeddings)
+#   <base>.nrm       header + float32 original norm of every row
+#   <base>.idx.json  version, dim, committed row count and the segment list
+#                    (identity, start row, row count, crc32)
+#
+# The two data files are opened with np.memmap, so every process that loads
+# the gallery shares the same page-cached copy. Only rows listed in the index
+# are visible; the index is the commit point.
+#
+# Enrollment appends rows past the committed count (write-ahead), fsyncs,
+# then atomically renames a new index into place. Removal only marks the
+# identity's segments as removed in the index. Neither rewrites the data.
+
+import os
+import sys
+import time
+import json
+import zlib
+import uuid
+import struct
+import pickle
+import numpy as np
+
+from src.matcher import EmbeddingMatcher
+
+GALLERY_VERSION = 1
+HEADER_SIZE = 64
+HEADER_FORMAT = "<8sII"  # magic, version, dim
+VEC_MAGIC = b"PGALVEC\0"
+NRM_MAGIC = b"PGALNRM\0"
+LOCK_TIMEOUT_S = 10
+LOCK_STALE_S = 60
+
+
+class GalleryFormatError(Exception):
+    pass
+
+
+def gallery_base(path):
+    """Accepts the legacy .pkl path (or any gallery file) and returns the gallery base path."""
+    for suffix in (".idx.json", ".vec", ".nrm", ".pkl"):
+        if path.endswith(suffix):
+            return path[: -len(suffix)]
+    return path
+
+
+def gallery_paths(base):
+    return {
+        "vec": base + ".vec",
+        "nrm": base + ".nrm",
+        "index": base + ".idx.json",
+        "lock": base + ".lock",
+    }
+
+
+def gallery_exists(path):
+    return os.path.exists(gallery_paths(gallery_base(path))["index"])
+
+
+def _header(magic, dim):
+    return struct.pack(HEADER_FORMAT, magic, GALLERY_VERSION, dim).ljust(HEADER_SIZE, b"\0")
+
+
+def _check_header(path, magic, dim):
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise GalleryFormatError(f"Truncated header in {path}")
+    file_magic, version, file_dim = struct.unpack_from(HEADER_FORMAT, raw)
+    if file_magic != magic:
+        raise GalleryFormatError(f"{path} is not a gallery file")
+    if version != GALLERY_VERSION:
+        raise GalleryFormatError(f"Unsupported gallery version {version} in {path}")
+    if file_dim != dim:
+        raise GalleryFormatError(f"Dimension mismatch in {path}: {file_dim} != {dim}")
+
+
+def segment_crc(unit_rows, norm_rows):
+    crc = zlib.crc32(np.ascontiguousarray(unit_rows, dtype=np.float32))
+    return zlib.crc32(np.ascontiguousarray(norm_rows, dtype=np.float32), crc) & 0xFFFFFFFF
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _GalleryLock:
+    """Cross-process writer lock (lock file created with O_EXCL; works on Windows too)."""
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT_S):
+        self.path = path
+        self.timeout = timeout
+        self.fd = None
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE_S:
+                        os.remove(self.path)  # Left behind by a crashed writer
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Gallery is locked: {self.path}")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+        os.remove(self.path)
+
+
+class GalleryStore:
+    def __init__(self, path):
+        self.base = gallery_base(path)
+        self.paths = gallery_paths(self.base)
+
+    def read_index(self):
+        if not os.path.exists(self.paths["index"]):
+            raise FileNotFoundError(f"[ERROR] Gallery index not found: {self.paths['index']}")
+        with open(self.paths["index"]) as f:
+            index = json.load(f)
+        if index.get("version") != GALLERY_VERSION:
+            raise GalleryFormatError(f"Unsupported gallery index version: {index.get('version')}")
+        return index
+
+    def open_arrays(self, index):
+        """Memory-maps the committed rows described by `index` (read-only, no copy)."""
+        dim, rows = index["dim"], index["rows"]
+        _check_header(self.paths["vec"], VEC_MAGIC, dim)
+        _check_header(self.paths["nrm"], NRM_MAGIC, dim)
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.float32)
+        unit = np.memmap(self.paths["vec"], dtype=np.float32, mode="r", offset=HEADER_SIZE, shape=(rows, dim))
+        norms = np.memmap(self.paths["nrm"], dtype=np.float32, mode="r", offset=HEADER_SIZE, shape=(rows,))
+        return unit, norms
+
+    def verify(self, index=None):
+        """Recomputes every segment checksum. Raises GalleryFormatError on mismatch."""
+        index = index or self.read_index()
+        unit, norms = self.open_arrays(index)
+        for seg in index["segments"]:
+            start, end = seg["start"], seg["start"] + seg["count"]
+            if segment_crc(unit[start:end], norms[start:end]) != seg["crc32"]:
+                raise GalleryFormatError(f"Checksum mismatch for {seg['identity']} rows {start}-{end}")
+        return True
+
+    def index_mtime(self):
+        try:
+            return os.stat(self.paths["index"]).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load_matcher(self, verify=False):
+        mtime = self.index_mtime()
+        index = self.read_index()
+        if verify:
+            self.verify(index)
+        unit, norms = self.open_arrays(index)
+        matcher = matcher_from_index(index, unit, norms)
+        matcher.source_mtime = mtime
+        return matcher
+
+    def refresh(self, matcher):
+        """
+        Returns `matcher` unchanged if the gallery hasn't moved on, otherwise a
+        new matcher for the latest generation. Only the index is re-read; the
+        memory maps are reopened at the new length, so rows that were already
+        paged in stay in the page cache. An attached ANN index is carried over
+        (rows appended after it was built are scanned exactly).
+        """
+        mtime = self.index_mtime()
+        if mtime is not None and mtime == getattr(matcher, "source_mtime", None):
+            return matcher
+
+        index = self.read_index()
+        if index.get("generation") == matcher.generation:
+            matcher.source_mtime = mtime
+            return matcher
+
+        unit, norms = self.open_arrays(index)
+        refreshed = matcher_from_index(index, unit, norms)
+        refreshed.source_mtime = mtime
+        if matcher.index is not None and refreshed.epoch == matcher.epoch:
+            refreshed.attach_index(matcher.index, exact_below=matcher.exact_below)
+        print(f"[INFO] Gallery reloaded: generation {matcher.generation} → {refreshed.generation}, "
+              f"{len(refreshed.identities)} people, {len(refreshed)} rows")
+        return refreshed
+
+    def _create(self, dim):
+        for key, magic in (("vec", VEC_MAGIC), ("nrm", NRM_MAGIC)):
+            with open(self.paths[key], "wb") as f:
+                f.write(_header(magic, dim))
+        _write_json_atomic(self.paths["index"], {
+            "version": GALLERY_VERSION, "dim": dim, "rows": 0, "generation": 0,
+            "epoch": uuid.uuid4().hex, "segments": [],
+        })
+
+    def append(self, identity, embeddings):
+        """Appends `embeddings` for `identity` as a new segment. Returns the new generation."""
+        block = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(block, axis=1).astype(np.float32)
+        unit = (block / np.maximum(norms, 1e-12)[:, None]).astype(np.float32)
+
+        with _GalleryLock(self.paths["lock"]):
+            if not os.path.exists(self.paths["index"]):
+                self._create(block.shape[1])
+            index = self.read_index()
+            if block.shape[1] != index["dim"]:
+                raise GalleryFormatError(f"Embedding dim {block.shape[1]} != gallery dim {index['dim']}")
+
+            start = index["rows"]
+            # Write-ahead: drop any torn tail from an interrupted append, add
+            # the new rows after the committed ones and make them durable
+            for key, array, width in (("vec", unit, index["dim"]), ("nrm", norms, 1)):
+                with open(self.paths[key], "r+b") as f:
+                    f.truncate(HEADER_SIZE + start * width * 4)
+                    f.seek(0, os.SEEK_END)
+                    f.write(array.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            index["segments"].append({
+                "identity": identity,
+                "start": start,
+                "count": len(unit),
+                "crc32": segment_crc(unit, norms),
+            })
+            index["rows"] = start + len(unit)
+            index["generation"] = index.get("generation", 0) + 1
+            _write_json_atomic(self.paths["index"], index)  # Commit point
+            return index["generation"]
+
+    def remove(self, identity):
+        """Tombstones every segment of `identity`. Returns the number of rows removed."""
+        with _GalleryLock(self.paths["lock"]):
+            index = self.read_index()
+            removed = 0
+            for seg in index["segments"]:
+                if seg["identity"] == identity and not seg.get("removed"):
+                    seg["removed"] = True
+                    removed += seg["count"]
+            if removed:
+                index["generation"] = index.get("generation", 0) + 1
+                _write_json_atomic(self.paths["index"], index)
+            return removed
+
+    def identities(self):
+        """Live identities and their sample counts."""
+        counts = {}
+        for seg in self.read_index()["segments"]:
+            if not seg.get("removed"):
+                counts[seg["identity"]] = counts.get(seg["identity"], 0) + seg["count"]
+        return counts
+
+    def write(self, embeddings_db):
+        """Writes a whole gallery from the legacy {name: [embedding, ...]} dict."""
+        matcher = EmbeddingMatcher.from_db(embeddings_db)
+        dim = matcher.dim
+
+        for key, magic, array in (("vec", VEC_MAGIC, matcher.unit), ("nrm", NRM_MAGIC, matcher.norms)):
+            tmp_path = self.paths[key] + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_header(magic, dim))
+                f.write(np.ascontiguousarray(array, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.paths[key])
+
+        segments = []
+        for start, count, ident in zip(matcher.seg_starts, matcher.seg_counts, matcher.seg_identity):
+            start, count = int(start), int(count)
+            segments.append({
+                "identity": matcher.identities[ident],
+                "start": start,
+                "count": count,
+                "crc32": segment_crc(matcher.unit[start:start + count], matcher.norms[start:start + count]),
+            })
+
+        try:
+            generation = self.read_index().get("generation", 0) + 1
+        except (FileNotFoundError, GalleryFormatError, ValueError):
+            generation = 1
+
+        _write_json_atomic(self.paths["index"], {
+            "version": GALLERY_VERSION,
+            "dim": dim,
+            "rows": len(matcher),
+            "generation": generation,
+            "epoch": uuid.uuid4().hex,  # Changes whenever rows are rewritten rather than appended
+            "segments": segments,
+        })
+        return len(matcher)
+
+
+def matcher_from_index(index, unit, norms):
+    identities, seg_starts, seg_counts, seg_identity = [], [], [], []
+    positions = {}
+    for seg in index["segments"]:
+        if seg.get("removed") or seg["count"] == 0:
+            continue
+        if seg["identity"] not in positions:
+            positions[seg["identity"]] = len(identities)
+            identities.append(seg["identity"])
+        seg_starts.append(seg["start"])
+        seg_counts.append(seg["count"])
+        seg_identity.append(positions[seg["identity"]])
+
+    matcher = EmbeddingMatcher(unit, norms, identities, seg_starts, seg_counts, seg_identity)
+    matcher.generation = index.get("generation", 0)
+    matcher.epoch = index.get("epoch")
+    return matcher
+
+
+def convert_pickle(pkl_path, base=None):
+    """One-shot conversion of a legacy authorized_embeddings.pkl into the gallery format."""
+    with open(pkl_path, "rb") as f:
+        embeddings_db = pickle.load(f)
+    store = GalleryStore(base or pkl_path)
+    rows = store.write(embeddings_db)
+    store.verify()
+    print(f"[INFO] Converted {pkl_path} → {store.base}.* ({len(embeddings_db)} people, {rows} vectors)")
+    return store
+
+
+if __name__ == "__main__":
+    default_pkl = os.path.join("face_auth", "embeddings", "authorized_embeddings.pkl")
+    convert_pickle(sys.argv[1] if len(sys.argv) > 1 else default_pkl)
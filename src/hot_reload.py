@@ -0,0 +1,183 @@
+# src/hot_reload.py
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.gallery_store import gallery_base, gallery_exists, gallery_paths, GalleryStore
+
+POLL_INTERVAL_S = 2.0
+
+
+class Snapshot:
+    """One immutable (model, matcher) version. Held by in-flight verifications until they finish."""
+
+    def __init__(self, version, model, matcher, source_stamp):
+        self.version = version
+        self.model = model
+        self.matcher = matcher
+        self.source_stamp = source_stamp
+        self.loaded_at = datetime.now()
+        self.in_flight = 0
+
+
+class ModelHolder:
+    """
+    Versioned holder for the face model and gallery matcher.
+
+    A watcher thread polls the gallery files' mtimes (portable, unlike
+    inotify) and rebuilds a new Snapshot in the background when they change;
+    request_reload() does the same on demand (e.g. from the admin endpoint).
+    The swap is a single reference assignment, so requests that already
+    acquired the old snapshot keep using it until they finish.
+    """
+
+    def __init__(self, embeddings_path, load_model, load_matcher, poll_interval=POLL_INTERVAL_S):
+        self.embeddings_path = embeddings_path
+        self._load_model = load_model
+        self._load_matcher = load_matcher
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._current = None
+        self._retired = []
+        self._failed_stamp = None
+
+    # ---- sources ----
+
+    def _watched_files(self):
+        paths = gallery_paths(gallery_base(self.embeddings_path))
+        return [self.embeddings_path, paths["index"]]
+
+    def source_stamp(self):
+        stamp = []
+        for path in self._watched_files():
+            try:
+                st = os.stat(path)
+                stamp.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append((path, None, None))
+        return tuple(stamp)
+
+    # ---- loading ----
+
+    def load(self):
+        """Initial, blocking load."""
+        stamp = self.source_stamp()
+        snapshot = Snapshot(1, self._load_model(), self._load_matcher(self.embeddings_path), stamp)
+        with self._lock:
+            self._current = snapshot
+        return snapshot
+
+    def current(self):
+        with self._lock:
+            if self._current is None:
+                raise RuntimeError("ModelHolder.load() has not been called")
+            return self._current
+
+    @property
+    def version(self):
+        return self.current().version
+
+    @contextmanager
+    def acquire(self):
+        """Pins the current snapshot for the duration of one verification."""
+        with self._lock:
+            snapshot = self._current
+            snapshot.in_flight += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.in_flight -= 1
+                self._prune_retired()
+
+    def _prune_retired(self):
+        still_used = [s for s in self._retired if s.in_flight > 0]
+        for s in self._retired:
+            if s.in_flight == 0:
+                print(f"[INFO] Released model/gallery version {s.version}")
+        self._retired = still_used
+
+    def _build(self, reload_model):
+        old = self.current()
+        stamp = self.source_stamp()
+        model = self._load_model() if reload_model else old.model
+
+        if gallery_exists(self.embeddings_path) and not reload_model:
+            # Gallery format: reuse the open matcher and only re-read what changed
+            matcher = GalleryStore(self.embeddings_path).refresh(old.matcher)
+            if old.matcher.index is not None and matcher.index is None:
+                # Gallery was rewritten, not appended: the ANN index must be rebuilt too
+                matcher = self._load_matcher(self.embeddings_path)
+        else:
+            matcher = self._load_matcher(self.embeddings_path)
+        return Snapshot(old.version + 1, model, matcher, stamp)
+
+    def reload(self, reload_model=False):
+        """Builds a new snapshot (blocking the caller, not requests) and swaps it in."""
+        with self._reload_lock:
+            started = time.perf_counter()
+            try:
+                snapshot = self._build(reload_model)
+            except Exception as e:
+                print(f"[ERROR] Reload failed, keeping version {self.version}: {e}")
+                self._failed_stamp = self.source_stamp()
+                return None
+
+            with self._lock:
+                previous = self._current
+                self._current = snapshot
+                if previous.in_flight > 0:
+                    self._retired.append(previous)
+                    print(f"[INFO] Version {previous.version} still serving {previous.in_flight} verification(s)")
+
+            print(f"[INFO] Swapped in model/gallery version {snapshot.version} "
+                  f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+            return snapshot.version
+
+    def request_reload(self, reload_model=False):
+        """Non-blocking reload; returns the background thread."""
+        thread = threading.Thread(target=self.reload, args=(reload_model,), name="model-reload", daemon=True)
+        thread.start()
+        return thread
+
+    # ---- watching ----
+
+    def start_watching(self):
+        if self._watcher and self._watcher.is_alive():
+            return self
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="gallery-watcher", daemon=True)
+        self._watcher.start()
+        return self
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                stamp = self.source_stamp()
+                if stamp != self.current().source_stamp and stamp != self._failed_stamp:
+                    print("[INFO] Embeddings changed on disk, reloading...")
+                    self.reload()
+            except Exception as e:
+                print(f"[WARN] Gallery watcher: {e}")
+
+    def status(self):
+        snapshot = self.current()
+        with self._lock:
+            retired = [{"version": s.version, "in_flight": s.in_flight} for s in self._retired]
+        return {
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at.isoformat(timespec="seconds"),
+            "people": len(snapshot.matcher.identities),
+            "vectors": len(snapshot.matcher),
+            "in_flight": snapshot.in_flight,
+            "retired": retired,
+        }
@@ -0,0 +1,210 @@
+# src/inference_server.py
+#
+# Long-lived local inference daemon. Keeps DeepFace/Facenet warm so the
+# Flask backend and CLI tools can hand frames over a Unix socket instead of
+# importing TensorFlow and building the model themselves.
+#
+#   python -m src.inference_server            # start the daemon
+#
+# Wire format (both directions): 4-byte big-endian header length, a JSON
+# header, then the raw array bytes described by the header.
+
+import os
+import json
+import stat
+import time
+import struct
+import socket
+import threading
+import socketserver
+import numpy as np
+
+from src.predict_with_embed import load_model, embed_faces, get_embeddings_batch
+
+
+def _default_socket_path():
+    """Per-user location: $XDG_RUNTIME_DIR when set, else ~/.percepta (never a shared /tmp path)."""
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".percepta")
+    return os.path.join(runtime_dir, "percepta-inference.sock")
+
+
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET") or _default_socket_path()
+CONNECT_TIMEOUT_S = 0.5
+REQUEST_TIMEOUT_S = 30.0
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Socket closed mid-message")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, header, arrays=()):
+    header = dict(header)
+    header["arrays"] = [{"shape": list(a.shape), "dtype": str(a.dtype)} for a in arrays]
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(raw)) + raw)
+    for array in arrays:
+        sock.sendall(np.ascontiguousarray(array).tobytes())
+
+
+def recv_message(sock):
+    (length,) = struct.unpack(">I", _recv_exact(sock, 4))
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    arrays = []
+    for spec in header.pop("arrays", []):
+        dtype = np.dtype(spec["dtype"])
+        size = int(np.prod(spec["shape"])) * dtype.itemsize
+        arrays.append(np.frombuffer(_recv_exact(sock, size), dtype=dtype).reshape(spec["shape"]))
+    return header, arrays
+
+
+class InferenceClient:
+    """
+    Stands in for the local model: get_embeddings_batch() delegates to
+    embed_images() when it is handed one of these.
+    """
+
+    def __init__(self, socket_path=INFERENCE_SOCKET):
+        self.socket_path = socket_path
+
+    def _call(self, header, arrays=(), timeout=REQUEST_TIMEOUT_S):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT_S)
+            sock.connect(self.socket_path)
+            sock.settimeout(timeout)
+            send_message(sock, header, arrays)
+            reply, reply_arrays = recv_message(sock)
+        if reply.get("error"):
+            raise RuntimeError(f"Inference daemon error: {reply['error']}")
+        return reply, reply_arrays
+
+    def available(self):
+        if not hasattr(socket, "AF_UNIX") or not os.path.exists(self.socket_path):
+            return False
+        try:
+            self._call({"op": "ping"}, timeout=CONNECT_TIMEOUT_S)
+            return True
+        except (OSError, RuntimeError, ConnectionError):
+            return False
+
+    def embed_images(self, images, confidences=None):
+        present = [i for i, img in enumerate(images) if img is not None]
+        reply, arrays = self._call({"op": "embed"}, [images[i] for i in present])
+        embeddings = [None] * len(images)
+        vectors = iter(arrays)
+        for i, found in zip(present, reply["found"]):
+            if found:
+                embeddings[i] = next(vectors)
+        if confidences is not None:
+            by_index = dict(zip(present, reply["confidences"]))
+            confidences.extend(by_index.get(i, 0.0) for i in range(len(images)))
+        return embeddings
+
+    def status(self):
+        return self._call({"op": "status"})[0]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        try:
+            header, arrays = recv_message(self.request)
+            op = header.get("op")
+            if op == "ping":
+                send_message(self.request, {"ok": True})
+            elif op == "status":
+                send_message(self.request, server.status())
+            elif op == "embed":
+                confidences = []
+                with server.lock:  # Keras models aren't safe to call from several threads
+                    images = [a.copy() for a in arrays]  # frombuffer arrays are read-only
+                    embeddings = get_embeddings_batch(server.model, images, confidences=confidences)
+                server.served += 1
+                send_message(
+                    self.request,
+                    {"found": [e is not None for e in embeddings], "confidences": confidences},
+                    [np.asarray(e, dtype=np.float32) for e in embeddings if e is not None],
+                )
+            else:
+                send_message(self.request, {"error": f"unknown op {op!r}"})
+        except Exception as e:
+            try:
+                send_message(self.request, {"error": str(e)})
+            except OSError:
+                pass
+
+
+# Unix sockets only; on hosts without AF_UNIX the client reports "unavailable"
+# and callers load the model in-process as before.
+_UnixServer = getattr(socketserver, "UnixStreamServer", None)
+
+
+def _prepare_socket_path(socket_path):
+    """Creates the socket's directory (owner-only) and clears a stale socket, refusing to touch anything else."""
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    try:
+        info = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise RuntimeError(f"{socket_path} exists and is not a socket owned by this user; refusing to replace it")
+    if InferenceClient(socket_path).available():
+        raise RuntimeError(f"An inference daemon is already serving on {socket_path}")
+    os.remove(socket_path)  # Stale socket from a previous run
+
+
+class InferenceServer(socketserver.ThreadingMixIn, _UnixServer or socketserver.BaseServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path=INFERENCE_SOCKET):
+        if _UnixServer is None:
+            raise RuntimeError("The inference daemon needs Unix domain sockets, which this platform lacks; "
+                               "main.py and the backend load the model in-process instead.")
+        _prepare_socket_path(socket_path)  # Before the slow model load, so a bad path fails fast
+
+        # Load before binding so clients never connect to a cold daemon
+        started = time.perf_counter()
+        self.model = load_model()
+        self.warm_up()
+        self.load_ms = (time.perf_counter() - started) * 1000
+
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.served = 0
+
+    def warm_up(self):
+        """Runs one dummy batch so the first real request doesn't pay graph tracing."""
+        try:
+            embed_faces(self.model, [np.zeros((160, 160, 3), dtype=np.float32)])
+        except Exception as e:
+            print(f"[WARN] Warm-up failed: {e}")
+
+    def status(self):
+        return {
+            "socket": self.socket_path,
+            "uptime_s": round(time.time() - self.started, 1),
+            "load_ms": round(self.load_ms, 1),
+            "served": self.served,
+        }
+
+
+if __name__ == "__main__":
+    server = InferenceServer()
+    print(f"[INFO] Inference daemon ready on {server.socket_path} (model loaded in {server.load_ms:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🚪 Exiting via Ctrl+C")
+    finally:
+        server.server_close()
+        if os.path.exists(server.socket_path):
+            os.remove(server.socket_path)
@@ -0,0 +1,117 @@
+# src/location.py
+
+import os
+import json
+import time
+import threading
+
+LOCATION_URL = "https://ipinfo.io/json"
+LOCATION_CACHE_PATH = os.getenv("LOCATION_CACHE_PATH", os.path.join("logs", "location_cache.json"))
+LOCATION_TTL_S = float(os.getenv("LOCATION_TTL_S", str(6 * 3600)))
+LOCATION_RETRY_S = 300.0  # After a failed lookup, wait this long before trying again
+LOOKUP_TIMEOUT_S = 10
+
+# Fixed installations can skip the lookup entirely:
+#   LOCATION_STATIC="12.97,77.59"  LOCATION_CITY="Bengaluru"  LOCATION_COUNTRY="IN"
+LOCATION_STATIC = os.getenv("LOCATION_STATIC")
+
+
+def static_location():
+    if not LOCATION_STATIC:
+        return None
+    return {
+        "loc": LOCATION_STATIC.replace(" ", ""),
+        "city": os.getenv("LOCATION_CITY", "Unknown"),
+        "country": os.getenv("LOCATION_COUNTRY", ""),
+        "source": "static",
+    }
+
+
+class LocationProvider:
+    """
+    Serves the installation's location from memory. get() never does
+    network I/O: a stale or missing entry only schedules a background
+    refresh. Results are persisted so a restart starts with a warm cache.
+    """
+
+    def __init__(self, cache_path=LOCATION_CACHE_PATH, ttl=LOCATION_TTL_S):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._next_attempt = 0.0
+        self._info, self._fetched_at = self._load()
+
+    def _load(self):
+        static = static_location()
+        if static:
+            return static, float("inf")
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            return cached["info"], cached["fetched_at"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None, 0.0
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"info": self._info, "fetched_at": self._fetched_at}, f)
+        os.replace(tmp, self.cache_path)
+
+    def stale(self):
+        return time.time() - self._fetched_at > self.ttl
+
+    def get(self):
+        """Cached location dict (ipinfo fields: loc, city, country, ...) or None; never blocks."""
+        if self.stale():
+            self.refresh_async()
+        return self._info
+
+    def refresh(self):
+        """Blocking lookup; keeps the previous entry if it fails."""
+        from src.notifier_telegram import get_session  # Shared keep-alive session
+        try:
+            info = get_session().get(LOCATION_URL, timeout=LOOKUP_TIMEOUT_S).json()
+            if "loc" not in info:
+                raise ValueError(f"no 'loc' in response: {info}")
+        except Exception as e:
+            print(f"[WARN] Location lookup failed, keeping cached value: {e}")
+            self._next_attempt = time.monotonic() + LOCATION_RETRY_S
+            return self._info
+        with self._lock:
+            self._info = {k: info.get(k) for k in ("loc", "city", "region", "country")}
+            self._fetched_at = time.time()
+            self._save()
+        print(f"[INFO] Location refreshed: {self._info.get('city')}, {self._info.get('country')}")
+        return self._info
+
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._next_attempt:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="location-refresh", daemon=True).start()
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_location_provider():
+    """Shared provider; the first call starts a background refresh if the cache is stale."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = LocationProvider()
+            if _provider.stale():
+                _provider.refresh_async()
+        return _provider
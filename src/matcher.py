@@ -0,0 +1,169 @@
+# src/matcher.py
+
+import numpy as np
+
+METRIC_COSINE = "cosine"
+METRIC_EUCLIDEAN = "euclidean"
+
+
+class EmbeddingMatcher:
+    """
+    Matches face embeddings against the authorized gallery.
+
+    All reference vectors are stacked once into a single L2-normalized
+    float32 matrix. Rows are grouped into contiguous segments, each
+    belonging to one identity, so a probe (or a batch of probes) is
+    scored with one matrix product and reduced per identity.
+    """
+
+    def __init__(self, unit, norms, identities, seg_starts, seg_counts, seg_identity):
+        self.unit = unit                      # (N, D) float32, rows L2-normalized
+        self.norms = norms                    # (N,) float32, original row norms
+        self.identities = list(identities)    # identity names
+        self.seg_starts = np.asarray(seg_starts, dtype=np.int64)
+        self.seg_counts = np.asarray(seg_counts, dtype=np.int64)
+        self.seg_identity = np.asarray(seg_identity, dtype=np.int64)
+        self.generation = 0        # gallery generation this matcher was built from
+        self.epoch = None          # gallery layout id; appends keep it, rewrites change it
+        self.source_mtime = None   # index file mtime, used by GalleryStore.refresh()
+        self.index = None          # optional IVFIndex, see attach_index()
+        self.exact_below = None    # distance under which index results must be exact
+        self._row_identity = None
+
+    @classmethod
+    def from_db(cls, embeddings_db):
+        """Builds a matcher from the legacy {name: [embedding, ...]} dict."""
+        identities, blocks = [], []
+        seg_starts, seg_counts, seg_identity = [], [], []
+        row = 0
+        for name, embeddings in embeddings_db.items():
+            block = np.asarray([np.asarray(e, dtype=np.float32).ravel() for e in embeddings], dtype=np.float32)
+            if block.size == 0:
+                continue
+            identities.append(name)
+            seg_starts.append(row)
+            seg_counts.append(len(block))
+            seg_identity.append(len(identities) - 1)
+            blocks.append(block)
+            row += len(block)
+
+        if not blocks:
+            raise ValueError("Embeddings database is empty.")
+
+        matrix = np.vstack(blocks)
+        norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+        unit = matrix / np.maximum(norms, 1e-12)[:, None]
+        return cls(unit.astype(np.float32), norms, identities, seg_starts, seg_counts, seg_identity)
+
+    def __len__(self):
+        return len(self.unit)
+
+    @property
+    def dim(self):
+        return self.unit.shape[1]
+
+    @property
+    def row_identity(self):
+        """Identity column for every row (-1 for rows outside any segment)."""
+        if self._row_identity is None:
+            row_identity = np.full(len(self.unit), -1, dtype=np.int64)
+            for start, count, ident in zip(self.seg_starts, self.seg_counts, self.seg_identity):
+                row_identity[start:start + count] = ident
+            self._row_identity = row_identity
+        return self._row_identity
+
+    def attach_index(self, index, exact_below=None):
+        """Routes cosine searches through an approximate index (see src/ann_index.py)."""
+        self.index = index
+        self.exact_below = exact_below
+
+    def row_distances(self, probes, metric=METRIC_COSINE):
+        """Returns a (P, N) matrix of distances from each probe to every reference row."""
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        probe_norms = np.linalg.norm(probes, axis=1)
+        sims = (probes / np.maximum(probe_norms, 1e-12)[:, None]) @ self.unit.T
+
+        if metric == METRIC_COSINE:
+            return 1.0 - sims
+        if metric == METRIC_EUCLIDEAN:
+            # ||q - x||^2 = |q|^2 + |x|^2 - 2|q||x|cos(q, x)
+            sq = (probe_norms[:, None] ** 2 + self.norms[None, :] ** 2
+                  - 2.0 * probe_norms[:, None] * self.norms[None, :] * sims)
+            return np.sqrt(np.maximum(sq, 0.0))
+        raise ValueError(f"Unknown metric: {metric}")
+
+    def identity_distances(self, row_distances):
+        """Reduces (P, N) row distances to (P, I) best distance per identity."""
+        # reduceat over [start, end) pairs; odd slots cover the gaps between segments
+        bounds = np.empty(2 * len(self.seg_starts), dtype=np.int64)
+        bounds[0::2] = self.seg_starts
+        bounds[1::2] = self.seg_starts + self.seg_counts
+        padded = np.concatenate([row_distances, np.full((len(row_distances), 1), np.inf, dtype=row_distances.dtype)], axis=1)
+        seg_best = np.minimum.reduceat(padded, bounds, axis=1)[:, 0::2]
+
+        if len(self.seg_identity) == len(self.identities) and np.array_equal(self.seg_identity, np.arange(len(self.identities))):
+            return seg_best
+
+        best = np.full((len(row_distances), len(self.identities)), np.inf, dtype=row_distances.dtype)
+        np.minimum.at(best, (slice(None), self.seg_identity), seg_best)
+        return best
+
+    def search_batch(self, probes, k=1, metric=METRIC_COSINE):
+        """
+        Scores a batch of probes and returns, for each probe, a list of up to
+        k (identity, distance) pairs sorted by increasing distance.
+        """
+        if not self.identities:
+            return [[] for _ in np.atleast_2d(probes)]
+
+        if self.index is not None and metric == METRIC_COSINE:
+            per_identity = self._indexed_identity_distances(probes)
+        else:
+            per_identity = self.identity_distances(self.row_distances(probes, metric))
+        k = min(k, per_identity.shape[1])
+
+        if k < per_identity.shape[1]:
+            top = np.argpartition(per_identity, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(per_identity.shape[1]), (len(per_identity), 1))
+
+        results = []
+        for p, cols in enumerate(top):
+            ordered = cols[np.argsort(per_identity[p, cols])]
+            results.append([(self.identities[c], float(per_identity[p, c])) for c in ordered
+                            if np.isfinite(per_identity[p, c])])
+        return results
+
+    def _indexed_identity_distances(self, probes):
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        units = probes / np.maximum(np.linalg.norm(probes, axis=1), 1e-12)[:, None]
+
+        best = np.full((len(units), len(self.identities)), np.inf, dtype=np.float32)
+        for p, q_unit in enumerate(units):
+            rows, distances = self.index.search(q_unit, exact_below=self.exact_below)
+            if len(self.unit) > self.index.n_rows:
+                # Rows enrolled after the index was built are scanned exactly
+                tail = np.arange(self.index.n_rows, len(self.unit))
+                rows = np.concatenate([rows, tail])
+                distances = np.concatenate([distances, 1.0 - self.unit[self.index.n_rows:] @ q_unit])
+            idents = self.row_identity[rows]
+            live = idents >= 0
+            np.minimum.at(best[p], idents[live], distances[live].astype(np.float32))
+        return best
+
+    def search(self, probe, k=1, metric=METRIC_COSINE):
+        return self.search_batch(probe, k=k, metric=metric)[0]
+
+    def best_match(self, probe, metric=METRIC_COSINE):
+        """Returns (identity, distance) of the closest reference."""
+        matches = self.search(probe, k=1, metric=metric)
+        if not matches:
+            return None, float("inf")
+        return matches[0]
+
+
+def as_matcher(embeddings):
+    """Accepts either a ready matcher or the legacy embeddings dict."""
+    if isinstance(embeddings, EmbeddingMatcher):
+        return embeddings
+    return EmbeddingMatcher.from_db(embeddings)
@@ -2,6 +2,8 @@
 
 import smtplib
 import ssl
+import time
+import threading
 from email.message import EmailMessage
 from dotenv import load_dotenv
 import os
@@ -13,34 +15,168 @@ SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 EMAIL_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
 RECEIVER_EMAIL = SENDER_EMAIL  # Send alert to yourself
 
-def send_alert(image_path):
+# Point these at a local SMTP server (SMTP_USE_SSL=false) to test without Gmail
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+SMTP_TIMEOUT_S = 20
+SMTP_KEEPALIVE_S = 60     # NOOP interval while the session is idle
+SMTP_IDLE_CLOSE_S = 600   # Close the session after this long without alerts
+
+def send_alert(image_path, extra_images=(), body=None):
     """
-    Sends an email alert with the intruder's image.
+    Sends an email alert with the intruder's image (plus `extra_images` for a
+    digest) over the shared SMTP session. `body` is appended to the default text.
+    Raises if delivery fails, so the alert dispatcher can retry it.
     """
     if not SENDER_EMAIL or not EMAIL_PASSWORD:
-        print("❌ Email credentials not found. Check your .env file.")
-        return
+        # Raise rather than return: the dispatcher would count a return as delivered
+        raise RuntimeError("Email credentials not found. Check your .env file.")
 
-    subject = "🚨 Intruder Detected!"
-    body = "An unrecognized person was detected. See attached image."
+    subject = "🚨 Intruder Detected!" if not extra_images else f"🚨 Intruder Detected ({len(extra_images) + 1} images)"
+    text = "An unrecognized person was detected. See attached image."
+    if body:
+        text += f"\n\n{body}"
 
     msg = EmailMessage()
     msg['From'] = SENDER_EMAIL
     msg['To'] = RECEIVER_EMAIL
     msg['Subject'] = subject
-    msg.set_content(body)
+    msg.set_content(text)
 
-    # Attach image
-    with open(image_path, 'rb') as f:
-        img_data = f.read()
-        msg.add_attachment(img_data, maintype='image', subtype='jpeg', filename=os.path.basename(image_path))
+    # Attach images
+    for path in [image_path, *extra_images]:
+        with open(path, 'rb') as f:
+            img_data = f.read()
+            msg.add_attachment(img_data, maintype='image', subtype='jpeg', filename=os.path.basename(path))
 
     # Send email
-    context = ssl.create_default_context()
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-            server.login(SENDER_EMAIL, EMAIL_PASSWORD)
-            server.send_message(msg)
-            print(f"📩 Alert email sent with image: {image_path}")
+        get_smtp_client().send(msg)
+        print(f"📩 Alert email sent with image: {image_path}")
     except Exception as e:
         print(f"❌ Failed to send email: {e}")
+        raise
+
+
+def _timed_out(error):
+    """smtplib reports a reply timeout as SMTPServerDisconnected; the TimeoutError is in its context."""
+    while error is not None:
+        if isinstance(error, TimeoutError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class SMTPClient:
+    """
+    One long-lived SMTP session shared by all alerts. A keepalive thread
+    sends NOOP while the session is idle and closes it after
+    SMTP_IDLE_CLOSE_S; a dead session is detected and replaced before the
+    next send, which is retried once on a fresh connection.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_USE_SSL,
+                 keepalive=SMTP_KEEPALIVE_S, idle_close=SMTP_IDLE_CLOSE_S):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.keepalive = keepalive
+        self.idle_close = idle_close
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self._keepalive_thread = None
+        self.stats = {"connects": 0, "reused": 0, "reconnects": 0, "noops": 0, "sent": 0}
+
+    def _connect(self):
+        """
+        New session. Any failure here, timeouts included, happens before the
+        message goes out, so it is raised as ConnectionError: safe to retry.
+        """
+        server = None
+        try:
+            if self.use_ssl:
+                server = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context(), timeout=SMTP_TIMEOUT_S)
+                server.login(SENDER_EMAIL, EMAIL_PASSWORD)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_S)
+        except OSError as e:  # smtplib.SMTPException is an OSError too
+            if server is not None:
+                server.close()
+            raise ConnectionError(f"SMTP connect to {self.host}:{self.port} failed: {e}") from e
+        self.stats["connects"] += 1
+        return server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _alive(self):
+        try:
+            self.stats["noops"] += 1
+            return self._server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def send(self, msg):
+        with self._lock:
+            if self._server is not None and time.monotonic() - self._last_used > self.keepalive and not self._alive():
+                self._close()  # Went stale between keepalives
+                self.stats["reconnects"] += 1
+            reused = self._server is not None
+            for attempt in (1, 2):
+                if self._server is None:
+                    self._server = self._connect()
+                try:
+                    self._server.send_message(msg)
+                    break
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    self._close()
+                    if _timed_out(e):
+                        # The server may already have the message; resending could duplicate it
+                        raise TimeoutError(f"SMTP server did not answer: {e}") from e
+                    if attempt == 2:
+                        raise
+                    self.stats["reconnects"] += 1
+                    reused = False
+            self.stats["sent"] += 1
+            self.stats["reused"] += int(reused)
+            self._last_used = time.monotonic()
+        self._start_keepalive()
+
+    def _start_keepalive(self):
+        if self._keepalive_thread and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="smtp-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while True:
+            time.sleep(self.keepalive)
+            with self._lock:
+                if self._server is None:
+                    return
+                if time.monotonic() - self._last_used > self.idle_close or not self._alive():
+                    self._close()
+                    return
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, connected=self._server is not None)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_smtp_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SMTPClient()
+        return _client
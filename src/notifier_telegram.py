@@ -1,38 +1,162 @@
-import requests
 import os
+import json
+import threading
+from contextlib import ExitStack
 from dotenv import load_dotenv
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")  # Override for a local stand-in
+HTTP_TIMEOUT_S = 15
+
+def _requests():
+    import requests  # Imported on first use to keep `import main` cheap
+    return requests
+
+HTTP_POOL_SIZE = 8
+
+_session = None
+_session_lock = threading.Lock()
+_stats = {}  # host -> {"requests", "connections"}
+_stats_lock = threading.Lock()
+
+def _count(host, key):
+    with _stats_lock:
+        entry = _stats.setdefault(host, {"requests": 0, "connections": 0})
+        entry[key] += 1
+
+def _counting_pools():
+    """urllib3 pool classes whose connections report every new TCP/TLS connect."""
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            _count(f"{self.host}:{self.port}", "connections")
+            super().connect()
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            _count(f"{self.host}:{self.port}", "connections")
+            super().connect()
+
+    class CountingHTTPPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    return {"http": CountingHTTPPool, "https": CountingHTTPSPool}
+
+def get_session():
+    """
+    Shared keep-alive session for the Bot API and the location lookup, so repeated
+    alerts reuse TLS connections instead of handshaking every call.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            requests = _requests()
+            from urllib.parse import urlsplit
+            from urllib3.util.retry import Retry
+            session = requests.Session()
+            # Only retry failures to (re)connect, e.g. a pooled connection the
+            # server already closed; anything else is left to the alert dispatcher
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE,
+                                                    max_retries=Retry(total=2, connect=2, read=0, status=0))
+            adapter.poolmanager.pool_classes_by_scheme = _counting_pools()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+            def count_request(response, *args, **kwargs):
+                url = urlsplit(response.url)
+                _count(f"{url.hostname}:{url.port or (443 if url.scheme == 'https' else 80)}", "requests")
+            session.hooks["response"].append(count_request)
+            _session = session
+        return _session
+
+def connection_stats():
+    """Requests vs. new connections per host; the difference is connection reuse."""
+    with _stats_lock:
+        return {host: dict(entry, reused=max(0, entry["requests"] - entry["connections"]))
+                for host, entry in _stats.items()}
+
+def _api(method):
+    return f"{TELEGRAM_API_URL}/bot{BOT_TOKEN}/{method}"
+
+def _post(method, **kwargs):
+    """POSTs to the Bot API; raises on HTTP errors so failed sends can be retried."""
+    response = get_session().post(_api(method), timeout=HTTP_TIMEOUT_S, **kwargs)
+    response.raise_for_status()
+    return response
 
 def send_tg_message(message):
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {"chat_id": CHAT_ID, "text": message}
-    requests.post(url, data=payload)
+    _post("sendMessage", data=payload)
 
 def send_tg_photo(image_path, caption=None):
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto"
     with open(image_path, "rb") as photo:
         files = {"photo": photo}
         data = {"chat_id": CHAT_ID, "caption": caption or ""}
-        requests.post(url, files=files, data=data)
+        _post("sendPhoto", files=files, data=data)
 
-def send_tg_location():
-    ip_info = requests.get("https://ipinfo.io/json").json()
-    if 'loc' in ip_info:
-        lat, lon = ip_info['loc'].split(',')
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendLocation"
-        payload = {"chat_id": CHAT_ID, "latitude": lat, "longitude": lon}
-        requests.post(url, data=payload)
+def send_tg_media_group(image_paths, caption=None):
+    """Sends up to 10 photos as one album; the caption goes on the first one."""
+    with ExitStack() as stack:
+        files, media = {}, []
+        for i, path in enumerate(image_paths[:10]):
+            files[f"photo{i}"] = stack.enter_context(open(path, "rb"))
+            item = {"type": "photo", "media": f"attach://photo{i}"}
+            if i == 0 and caption:
+                item["caption"] = caption
+            media.append(item)
+        _post("sendMediaGroup", files=files, data={"chat_id": CHAT_ID, "media": json.dumps(media)})
 
-def send_telegram_alert(image_path, location_info=None):
-    caption = "🚨 Intruder Alert!"
+def send_tg_location(location_info=None):
+    """Sends a map pin for the installation; uses the cached location, never a fresh lookup."""
+    if location_info is None:
+        from src.location import get_location_provider
+        location_info = get_location_provider().get()
+    if location_info and location_info.get('loc'):
+        lat, lon = location_info['loc'].split(',')
+        payload = {"chat_id": CHAT_ID, "latitude": lat, "longitude": lon}
+        _post("sendLocation", data=payload)
+    return location_info
 
+def _alert_caption(title, location_info, note=None):
+    caption = title
     if location_info:
         caption += f"\n\n📍 Location: {location_info.get('city', 'Unknown')}, {location_info.get('country', '')}"
+    if note:
+        caption += f"\n\n{note}"
+    return caption
+
+def _cached_location(location_info):
+    if location_info is None:
+        from src.location import get_location_provider
+        location_info = get_location_provider().get()
+    return location_info
+
+def send_telegram_alert(image_path, location_info=None, note=None, progress=None):
+    """
+    Message, photo, then map pin. Parts named in `progress` are skipped and
+    each part is added once sent, so a retry with the same set only sends
+    what is still missing.
+    """
+    progress = progress if progress is not None else set()
+    location_info = _cached_location(location_info)
+    caption = _alert_caption("🚨 Intruder Alert!", location_info, note)
+
+    for part, send in (("message", lambda: send_tg_message(caption)),
+                       ("photo", lambda: send_tg_photo(image_path, caption)),
+                       ("location", lambda: send_tg_location(location_info))):
+        if part not in progress:
+            send()
+            progress.add(part)
 
-    send_tg_message(caption)
-    send_tg_photo(image_path, caption)
-    send_tg_location()
+def send_telegram_digest(image_paths, summary, location_info=None):
+    """One album for a burst of alerts instead of a message + photo + pin per event."""
+    caption = _alert_caption("🚨 Intruder Alert (continued)", _cached_location(location_info), summary)
+    send_tg_media_group(image_paths, caption)
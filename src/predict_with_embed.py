@@ -1,10 +1,15 @@
 import os
+import time
+import queue
 import pickle
+import threading
+import cv2
 import numpy as np
-from deepface import DeepFace
-from src.camera import capture_images
+from src.camera import capture_frames
 from datetime import datetime
-from scipy.spatial.distance import cosine
+from src.matcher import EmbeddingMatcher, as_matcher
+from src.ann_index import IVFIndex, index_path_for
+from src.gallery_store import GalleryStore, gallery_exists
 
 # Constants
 MODEL_NAME = "Facenet"
@@ -13,9 +18,19 @@ ENFORCE_DETECTION = False  # For inference, allow fallback even if face not foun
 THRESHOLD = 0.4  # Cosine distance threshold
 EMBEDDINGS_PATH = os.path.join("face_auth", "embeddings", "authorized_embeddings.pkl")
 
+# Approximate nearest-neighbour index (only worth it for large galleries)
+ANN_MIN_GALLERY = 5000  # Auto-enable the index at or above this many reference vectors
+ANN_NPROBE = 8          # Partitions scanned per probe: higher = better recall, slower
+ANN_EXACT_DECISIONS = True  # Widen the scan when needed so accept/reject always matches brute force
+
+def _deepface():
+    # Imported on first use: DeepFace pulls in TensorFlow, which takes seconds to load
+    from deepface import DeepFace
+    return DeepFace
+
 def load_model():
     print("[INFO] Loading DeepFace model...")
-    model = DeepFace.build_model(MODEL_NAME)
+    model = _deepface().build_model(MODEL_NAME)
     print("[INFO] Model loaded successfully.")
     return model
 
@@ -27,9 +42,58 @@ def load_embeddings(path):
     print(f"[INFO] Loaded embeddings for {len(data)} authorized people.")
     return data
 
+def load_ann_index(matcher, embeddings_path, nprobe=ANN_NPROBE):
+    index_path = index_path_for(embeddings_path)
+    if os.path.exists(index_path):
+        try:
+            index = IVFIndex.load(index_path, nprobe=nprobe)
+            if index.matches(matcher.unit):
+                index.bind(matcher.unit)
+                return index
+            print("[INFO] ANN index is stale, rebuilding...")
+        except Exception as e:
+            print(f"[WARN] Could not load ANN index {index_path}: {e}")
+
+    index = IVFIndex.build(matcher.unit, nprobe=nprobe)
+    try:
+        index.save(index_path)
+    except OSError as e:
+        print(f"[WARN] Could not persist ANN index: {e}")
+    return index
+
+def load_matcher(path, use_index=None, nprobe=ANN_NPROBE):
+    """
+    Loads the gallery matcher. Prefers the memory-mapped gallery next to
+    `path` (see src/gallery_store.py) and falls back to the legacy pickle.
+    """
+    if gallery_exists(path):
+        matcher = GalleryStore(path).load_matcher()
+        print(f"[INFO] Memory-mapped gallery: {len(matcher.identities)} authorized people.")
+    else:
+        matcher = EmbeddingMatcher.from_db(load_embeddings(path))
+    print(f"[INFO] Matcher ready: {len(matcher)} reference vectors, dim {matcher.dim}.")
+
+    if use_index is None:
+        use_index = len(matcher) >= ANN_MIN_GALLERY
+    if use_index:
+        exact_below = THRESHOLD if ANN_EXACT_DECISIONS else None
+        matcher.attach_index(load_ann_index(matcher, path, nprobe), exact_below=exact_below)
+        print(f"[INFO] ANN index enabled ({matcher.index.n_lists} lists, nprobe={nprobe}).")
+    return matcher
+
+def refresh_matcher(matcher, path=EMBEDDINGS_PATH):
+    """Picks up enrollments/removals made since `matcher` was loaded (gallery format only)."""
+    if not gallery_exists(path):
+        return matcher
+    try:
+        return GalleryStore(path).refresh(matcher)
+    except Exception as e:
+        print(f"[WARN] Gallery refresh failed, keeping current matcher: {e}")
+        return matcher
+
 def get_embedding(model, image_path):
     try:
-        reps = DeepFace.represent(
+        reps = _deepface().represent(
             img_path=image_path,
             model_name=MODEL_NAME,
             detector_backend=DETECTOR_BACKEND,
@@ -38,36 +102,161 @@ def get_embedding(model, image_path):
         if isinstance(reps, list) and reps:
             return np.array(reps[0]["embedding"])
     except Exception as e:
-        print(f"[WARN] Failed to process {image_path}: {e}")
+        label = image_path if isinstance(image_path, str) else "in-memory frame"
+        print(f"[WARN] Failed to process {label}: {e}")
     return None
 
 def compare_embedding(embedding, embeddings_db):
-    best_match = None
-    best_score = float("inf")
-
-    for person, embeddings in embeddings_db.items():
-        for ref_embedding in embeddings:
-            score = cosine(embedding, ref_embedding)
-            if score < best_score:
-                best_score = score
-                best_match = person
+    matcher = as_matcher(embeddings_db)
+    best_match, best_score = matcher.best_match(embedding)
     print(f"[DEBUG] Best match: {best_match}, score: {best_score}")
     return best_match, best_score
 
-def verify_captured_images(image_paths, model, embeddings_db):
+def decode_images(captures):
+    """Returns BGR arrays for a mix of in-memory Frames and JPEG paths."""
+    images = []
+    for capture in captures:
+        if hasattr(capture, "image"):
+            images.append(capture.image)
+            continue
+        img = cv2.imread(capture)
+        if img is None:
+            print(f"[WARN] Could not read {capture}")
+        images.append(img)
+    return images
+
+def detect_face(image):
+    """
+    Returns (face, confidence) for the first aligned face crop (RGB, [0, 1])
+    found in a BGR image, or (None, 0.0).
+    """
+    if image is None:
+        return None, 0.0
+    try:
+        faces = _deepface().extract_faces(
+            img_path=image,
+            detector_backend=DETECTOR_BACKEND,
+            enforce_detection=ENFORCE_DETECTION,
+            align=True
+        )
+        if faces:
+            return faces[0]["face"], float(faces[0].get("confidence") or 0.0)
+    except Exception as e:
+        print(f"[WARN] Face detection failed: {e}")
+    return None, 0.0
+
+def _keras_model(model):
+    # DeepFace >= 0.0.80 wraps the Keras network in a client object
+    return getattr(model, "model", model)
+
+def _letterbox(face, size):
+    """Resizes a face crop into `size` keeping aspect ratio, padding with black (as DeepFace does)."""
+    target_h, target_w = size
+    factor = min(target_h / face.shape[0], target_w / face.shape[1])
+    resized = cv2.resize(face, (max(1, int(face.shape[1] * factor)), max(1, int(face.shape[0] * factor))))
+    pad_h = target_h - resized.shape[0]
+    pad_w = target_w - resized.shape[1]
+    padded = np.pad(resized, ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)), "constant")
+    if padded.shape[:2] != (target_h, target_w):
+        padded = cv2.resize(padded, (target_w, target_h))
+    return padded.astype(np.float32)
+
+def embed_faces(model, faces):
+    """Runs every face crop through Facenet in a single forward pass. Returns an (n, d) array."""
+    net = _keras_model(model)
+    size = tuple(net.input_shape[1:3])
+    # DeepFace feeds the network BGR crops in [0, 1] ("base" normalization)
+    batch = np.stack([_letterbox(face[:, :, ::-1], size) for face in faces])
+    return np.asarray(net(batch, training=False), dtype=np.float32)
+
+_model_lock = threading.Lock()  # Serializes every in-process detection/embedding call
+_local_model = None
+_local_model_lock = threading.Lock()
+
+def _fallback_model():
+    """In-process model for when the inference daemon goes away; loaded on first need."""
+    global _local_model
+    with _local_model_lock:
+        if _local_model is None:
+            _local_model = load_model()
+        return _local_model
+
+def get_embeddings_batch(model, images, timings=None, confidences=None):
+    """
+    Detects faces on every decoded frame, then embeds all crops at once.
+    Returns a list aligned with `images`, holding an embedding or None.
+    Detector confidences are appended to `confidences` when given.
+    """
+    timings = timings if timings is not None else {}
+
+    if hasattr(model, "embed_images"):
+        # Remote model (src/inference_server.py): detection and embedding run in the warm daemon
+        start = time.perf_counter()
+        try:
+            embeddings = model.embed_images(images, confidences)
+            timings["remote_ms"] = (time.perf_counter() - start) * 1000
+            return embeddings
+        except OSError as e:
+            # Daemon died or is restarting; every call reconnects, so it is used again once it is back
+            print(f"[WARN] Inference daemon unreachable ({e}), using the in-process model")
+            model = _fallback_model()
+
+    with _model_lock:  # Keras/MTCNN models aren't safe to call from several threads (e.g. zone workers)
+        start = time.perf_counter()
+        detections = [detect_face(img) for img in images]
+        faces = [face for face, _ in detections]
+        if confidences is not None:
+            confidences.extend(conf for _, conf in detections)
+        timings["detect_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        embeddings = [None] * len(images)
+        found = [i for i, face in enumerate(faces) if face is not None]
+        if found:
+            try:
+                vectors = embed_faces(model, [faces[i] for i in found])
+                for i, vector in zip(found, vectors):
+                    embeddings[i] = vector
+            except Exception as e:
+                print(f"[WARN] Batched embedding failed ({e}), falling back to per-image DeepFace.represent")
+                for i in found:
+                    embeddings[i] = get_embedding(model, images[i])
+        timings["embed_ms"] = (time.perf_counter() - start) * 1000
+    return embeddings
+
+def verify_captured_images(image_paths, model, embeddings_db, timings=None):
+    """
+    Verifies captured frames against the gallery. `image_paths` may hold
+    in-memory Frames (see src/camera.py) or JPEG paths; each result tuple
+    carries back the item it was computed from.
+    """
     print(f"[INFO] Starting verification on {len(image_paths)} images.")
     results = []
+    matcher = as_matcher(embeddings_db)
+    timings = timings if timings is not None else {}
+
+    start = time.perf_counter()
+    images = decode_images(image_paths)
+    timings["decode_ms"] = (time.perf_counter() - start) * 1000
+
+    embeddings = get_embeddings_batch(model, images, timings)
 
-    for img_path in image_paths:
+    start = time.perf_counter()
+    found = [i for i, emb in enumerate(embeddings) if emb is not None]
+    matches = matcher.search_batch(np.stack([embeddings[i] for i in found]), k=1) if found else []
+    best = {i: (m[0] if m else (None, float("inf"))) for i, m in zip(found, matches)}
+    timings["match_ms"] = (time.perf_counter() - start) * 1000
+
+    for i, img_path in enumerate(image_paths):
         print(f"\n[INFO] Processing image: {img_path}")
-        embedding = get_embedding(model, img_path)
 
-        if embedding is None:
+        if i not in best:
             print("[RESULT] ❌ Face not detected or embedding failed.")
             results.append(("Unknown", img_path, None))
             continue
 
-        name, score = compare_embedding(embedding, embeddings_db)
+        name, score = best[i]
+        print(f"[DEBUG] Best match: {name}, score: {score}")
 
         if score < THRESHOLD:
             print(f"[RESULT] ✅ Authorized person: {name} (cosine distance: {score:.4f})")
@@ -76,17 +265,71 @@ def verify_captured_images(image_paths, model, embeddings_db):
             print(f"[RESULT] 🚨 Intruder detected! (closest: {name}, distance: {score:.4f})")
             results.append(("Intruder", img_path, score))
 
+    print("[TIMING] " + ", ".join(f"{stage}={ms:.1f}" for stage, ms in timings.items()))
     return results
 
+def _produce(frames, frame_queue, stop_event):
+    try:
+        for frame in frames:
+            if stop_event.is_set():
+                break
+            frame_queue.put(frame)
+    except Exception as e:
+        print(f"[WARN] Frame producer stopped: {e}")
+    finally:
+        frame_queue.put(None)
+
+def verify_stream(frames, model, embeddings_db, stop_event=None):
+    """
+    Streaming verification. `frames` is consumed on a producer thread while
+    this generator embeds and matches each frame as soon as it arrives,
+    yielding (name, frame, score) tuples like verify_captured_images.
+    Capture stops when the caller sets `stop_event` or stops iterating;
+    main._run_pipeline stops once EvidenceFusion says the fused decision
+    can no longer change.
+    """
+    matcher = as_matcher(embeddings_db)
+    stop_event = stop_event or threading.Event()
+    frame_queue = queue.Queue()
+    producer = threading.Thread(target=_produce, args=(frames, frame_queue, stop_event), daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            frame = frame_queue.get()
+            if frame is None:
+                break
+
+            start = time.perf_counter()
+            confidences = []
+            embedding = get_embeddings_batch(model, decode_images([frame]), confidences=confidences)[0]
+            if hasattr(frame, "metadata"):
+                frame.metadata["face_confidence"] = confidences[0]
+            if embedding is None:
+                print(f"[RESULT] ❌ Face not detected in {frame}.")
+                yield ("Unknown", frame, None)
+                continue
+
+            name, score = matcher.best_match(embedding)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"[DEBUG] {frame}: best match {name}, score {score:.4f} ({elapsed:.0f} ms)")
+
+            if score < THRESHOLD:
+                yield (name, frame, score)
+            else:
+                yield ("Intruder", frame, score)
+    finally:
+        stop_event.set()
+
 def save_results(results):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     result_file = f"verification_results_{timestamp}.txt"
     with open(result_file, "w") as f:
         for name, path, score in results:
             if score is not None:
-                f.write(f"{name}: {os.path.basename(path)} (score: {score:.4f})\n")
+                f.write(f"{name}: {os.path.basename(str(path))} (score: {score:.4f})\n")
             else:
-                f.write(f"{name}: {os.path.basename(path)} (no face detected)\n")
+                f.write(f"{name}: {os.path.basename(str(path))} (no face detected)\n")
     print(f"[INFO] Results saved to {result_file}")
 
 if __name__ == "__main__":
@@ -94,23 +337,23 @@ if __name__ == "__main__":
     
     try:
         model = load_model()
-        embeddings_db = load_embeddings(EMBEDDINGS_PATH)
+        embeddings_db = load_matcher(EMBEDDINGS_PATH)
     except Exception as e:
         print(f"[ERROR] {e}")
         exit(1)
 
-    captured_paths = capture_images(num_images=5, delay=2)
+    captured_frames = list(capture_frames(num_images=5, delay=2))
     
-    if not captured_paths:
+    if not captured_frames:
         print("[ERROR] No images captured.")
     else:
-        results = verify_captured_images(captured_paths, model, embeddings_db)
+        results = verify_captured_images(captured_frames, model, embeddings_db)
         
         print("\n[SUMMARY]")
-        for name, path, score in results:
+        for name, frame, score in results:
             if score is not None:
-                print(f"- {name}: {os.path.basename(path)} (score: {score:.4f})")
+                print(f"- {name}: {frame} (score: {score:.4f})")
             else:
-                print(f"- {name}: {os.path.basename(path)} (no face detected)")
+                print(f"- {name}: {frame} (no face detected)")
         
         save_results(results)
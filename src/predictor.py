@@ -1,6 +1,5 @@
 import numpy as np
 from PIL import Image
-import tensorflow as tf  # Or use tflite_runtime.interpreter if you're on Raspberry Pi
 import os
 
 # Base paths
@@ -13,21 +12,28 @@ def load_labels():
     with open(LABELS_PATH, "r") as f:
         return [line.strip() for line in f.readlines()]
 
-# Load model
-interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-interpreter.allocate_tensors()
-
-# Get input/output details
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-
-# Image input size (height, width)
-height = input_details[0]['shape'][1]
-width = input_details[0]['shape'][2]
-
-labels = load_labels()
+# Model, tensor details and labels are loaded on first prediction, not at import
+_interpreter = None
+_details = None
+_labels = None
+
+def get_interpreter():
+    global _interpreter, _details, _labels
+    if _interpreter is None:
+        import tensorflow as tf  # Or use tflite_runtime.interpreter if you're on Raspberry Pi
+        interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
+        interpreter.allocate_tensors()
+        _details = (interpreter.get_input_details(), interpreter.get_output_details())
+        _labels = load_labels()
+        _interpreter = interpreter
+    return _interpreter, _details[0], _details[1], _labels
 
 def preprocess_image(image_path):
+    _, input_details, _, _ = get_interpreter()
+    # Image input size (height, width)
+    height = input_details[0]['shape'][1]
+    width = input_details[0]['shape'][2]
+
     image = Image.open(image_path).convert("RGB")
     image = image.resize((width, height))
     image_array = np.asarray(image, dtype=np.float32)  # Convert to float32
@@ -36,6 +42,7 @@ def preprocess_image(image_path):
     return input_data
 
 def predict(image_path):
+    interpreter, input_details, output_details, labels = get_interpreter()
     input_data = preprocess_image(image_path)
 
     # Set tensor
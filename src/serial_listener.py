@@ -1,31 +1,232 @@
 # src/serial_listener.py
 
-import serial
+import os
+import re
 import time
+import queue
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
 
-SERIAL_PORT = 'COM9'
-BAUD_RATE = 115200
+SERIAL_PORT = os.getenv("SERIAL_PORT", "COM9")
+BAUD_RATE = int(os.getenv("SERIAL_BAUD", "115200"))
+READ_TIMEOUT_S = 0.5
+REOPEN_DELAY_S = 2.0
 
-def wait_for_trigger():
+# Event kinds, parsed from the lines arduino/ultrasonic_trig prints
+EVENT_MOTION = "motion"
+EVENT_DISTANCE = "distance"      # value: distance in cm
+EVENT_PAUSED = "paused"          # ESP32 stopped measuring until it gets "resume"
+EVENT_RESUMED = "resumed"        # Ack for "resume"
+EVENT_NO_ECHO = "no_echo"
+EVENT_LINE = "line"              # Anything else
+EVENT_DISCONNECTED = "disconnected"
+
+_DISTANCE = re.compile(r"distance \(cm\):\s*([-+]?\d+(?:\.\d+)?)")
+
+
+@dataclass
+class SerialEvent:
+    kind: str
+    line: str = ""
+    value: float = None
+    timestamp: datetime = field(default_factory=datetime.now)
+
+
+def parse_event(line):
+    text = line.strip().lower()
+    match = _DISTANCE.search(text)
+    if match:
+        return SerialEvent(EVENT_DISTANCE, line, float(match.group(1)))
+    if text == "motion":
+        return SerialEvent(EVENT_MOTION, line)
+    if "paused" in text:
+        return SerialEvent(EVENT_PAUSED, line)
+    if "resuming" in text:
+        return SerialEvent(EVENT_RESUMED, line)
+    if "no echo" in text:
+        return SerialEvent(EVENT_NO_ECHO, line)
+    return SerialEvent(EVENT_LINE, line)
+
+
+class SerialService:
     """
-    Opens serial port, waits for 'motion', then returns True.
-    Keeps the port open for 'resume' command later.
+    Owns the ESP32 serial port for the life of the process. A reader thread
+    turns lines into SerialEvents and publishes them to subscribers; writes
+    such as send_resume() go through a queue to a writer thread, so callers
+    never block on the port. The port is only reopened after an error:
+    opening it toggles DTR, which resets most ESP32 boards.
     """
-    try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        print(f"🔌 Listening to serial port {SERIAL_PORT} for 'motion'...")
 
-        while True:
-            line = ser.readline().decode('utf-8', errors='ignore').strip().lower()
-            if line:
+    def __init__(self, port=SERIAL_PORT, baud_rate=BAUD_RATE, opener=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        self._opener = opener
+        self._serial = None
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._outbox = queue.Queue()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._threads = []
+        self.counts = {}
+
+    def _open(self):
+        if self._opener:
+            return self._opener()
+        import serial  # Imported on first use to keep `import main` cheap
+        return serial.Serial(self.port, self.baud_rate, timeout=READ_TIMEOUT_S)
+
+    def start(self):
+        if self._threads:
+            return self
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._read_loop, name="serial-reader", daemon=True),
+                         threading.Thread(target=self._write_loop, name="serial-writer", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._outbox.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self._close()
+
+    def _close(self):
+        self._connected.clear()
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+
+    # ---- pub/sub ----
+
+    def subscribe(self, callback, kinds=None):
+        """Calls callback(event) from the reader thread for events of `kinds` (all if None). Returns an unsubscribe function."""
+        entry = (callback, set(kinds) if kinds else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def _publish(self, event):
+        with self._lock:
+            self.counts[event.kind] = self.counts.get(event.kind, 0) + 1
+            subscribers = list(self._subscribers)
+        for callback, kinds in subscribers:
+            if kinds is None or event.kind in kinds:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"[WARN] Serial subscriber failed on {event.kind}: {e}")
+
+    def wait_for(self, kind=EVENT_MOTION, timeout=None):
+        """Blocks until the next event of `kind`; None on timeout."""
+        events = queue.Queue()
+        unsubscribe = self.subscribe(events.put, [kind])
+        try:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                # Short waits keep Ctrl+C responsive in the main thread
+                remaining = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+                if remaining <= 0:
+                    return None
+                try:
+                    return events.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+        finally:
+            unsubscribe()
+
+    # ---- I/O threads ----
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            if self._serial is None:
+                try:
+                    self._serial = self._open()
+                    self._connected.set()
+                    print(f"🔌 Listening to serial port {self.port}...")
+                except Exception as e:
+                    print(f"❌ Serial connection error: {e}; retrying in {REOPEN_DELAY_S:.0f}s")
+                    self._stop.wait(REOPEN_DELAY_S)
+                    continue
+            try:
+                raw = self._serial.readline()
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                print(f"⚠️ Serial read failed, reopening: {e}")
+                self._close()
+                self._publish(SerialEvent(EVENT_DISCONNECTED, str(e)))
+                continue
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line:
+                continue
+            event = parse_event(line)
+            if event.kind != EVENT_DISTANCE:
                 print(f"📨 Received: {line}")
-            if "motion" in line:
-                print("🎯 Motion detected via ESP!")
-                return ser  # Keep serial open for sending 'resume'
+            self._publish(event)
 
-    except serial.SerialException as e:
-        print(f"❌ Serial connection error: {e}")
-        return None
+    def _write_loop(self):
+        while True:
+            data = self._outbox.get()
+            if data is None or self._stop.is_set():
+                return
+            if not self._connected.wait(timeout=10):
+                print(f"⚠️ Serial port not connected, dropped {data!r}")
+                continue
+            try:
+                self._serial.write(data)
+                self._serial.flush()
+            except Exception as e:
+                print(f"⚠️ Serial write failed: {e}")
+
+    def send(self, command):
+        """Queues a line for the ESP32 and returns immediately."""
+        self._outbox.put(command.strip().encode("utf-8") + b"\n")
+
+    def send_resume(self):
+        """Tells the ESP32 to leave its post-motion pause; watch for EVENT_RESUMED to confirm."""
+        self.send("resume")
+
+    def status(self):
+        with self._lock:
+            return {"port": self.port, "connected": self._connected.is_set(), "events": dict(self.counts)}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_serial_service():
+    """Shared service, started on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SerialService().start()
+        return _service
+
+
+def wait_for_trigger(timeout=None):
+    """
+    Waits for the next 'motion' from the ESP32 on the shared serial service.
+    Returns the motion SerialEvent, or None on timeout or Ctrl+C.
+    """
+    try:
+        event = get_serial_service().wait_for(EVENT_MOTION, timeout)
+        if event:
+            print("🎯 Motion detected via ESP!")
+        return event
     except KeyboardInterrupt:
         print("\n🚪 Exiting via Ctrl+C")
         return None
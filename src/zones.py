@@ -0,0 +1,191 @@
+# src/zones.py
+#
+# Multi-door runtime: N sensors and M cameras grouped into zones. Each zone
+# has its own capture worker and a small bounded job queue; one shared pool
+# of inference workers serves all zones round-robin, so a busy door only
+# ever fills its own queue.
+#
+# Configured in config/zones.yaml (start from config/zones.example.yaml).
+#
+# In-process model calls are serialized (predict_with_embed._model_lock):
+# extra inference workers overlap matching, evidence writes and alerting,
+# never two forward passes. With the inference daemon running, the daemon
+# serializes them instead.
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.camera import CameraStream, RING_SIZE
+from src.serial_listener import SerialService, EVENT_MOTION, BAUD_RATE
+
+ZONES_CONFIG = os.getenv("ZONES_CONFIG", os.path.join("config", "zones.yaml"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+ZONE_QUEUE_SIZE = 2     # Pending triggers per zone; more are dropped (the zone is already busy)
+FRAMES_PER_ZONE = 5     # Frames handed to recognition per trigger, across the zone's cameras
+
+
+def load_config(path=ZONES_CONFIG):
+    import yaml
+    with open(path) as f:
+        config = yaml.safe_load(f)
+    for name, zone in config["zones"].items():
+        if zone["sensor"] not in config.get("sensors", {}):
+            raise ValueError(f"Zone {name}: unknown sensor {zone['sensor']!r}")
+        for camera in zone["cameras"]:
+            if camera not in config.get("cameras", {}):
+                raise ValueError(f"Zone {name}: unknown camera {camera!r}")
+    return config
+
+
+class Job:
+    def __init__(self, zone, frames, trigger_time):
+        self.zone = zone
+        self.frames = frames
+        self.trigger_time = trigger_time
+        self.queued_at = time.monotonic()
+
+
+class Zone:
+    def __init__(self, name, sensor, cameras, num_frames=FRAMES_PER_ZONE, queue_size=ZONE_QUEUE_SIZE):
+        self.name = name
+        self.sensor = sensor
+        self.cameras = cameras
+        self.num_frames = num_frames
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.busy = False  # A job of this zone is on an inference worker
+        self.stats = {"triggers": 0, "processed": 0, "dropped": 0, "last_result": None}
+
+    def capture(self, trigger_time):
+        """Best frames around the trigger from every camera of the zone, grabbed in parallel."""
+        per_camera = max(1, -(-self.num_frames // len(self.cameras)))  # Ceiling division
+        if len(self.cameras) == 1:
+            frames = self.cameras[0].burst(per_camera, trigger_time=trigger_time)
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.cameras)) as pool:
+                bursts = list(pool.map(lambda cam: cam.burst(per_camera, trigger_time=trigger_time), self.cameras))
+            frames = [f for burst in bursts for f in burst]
+        frames.sort(key=lambda f: f.metadata.get("sharpness", 0.0), reverse=True)
+        return frames[:self.num_frames]
+
+
+class ZoneRuntime:
+    """
+    `pipeline(frames, zone_name, log_callback)` runs recognition and alerting
+    for one trigger and returns its result string (see main.run_pipeline).
+    """
+
+    def __init__(self, config, pipeline, workers=INFERENCE_WORKERS):
+        self.pipeline = pipeline
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._next = 0  # Round-robin position over zones
+
+        self.sensors = {name: SerialService(s["port"], s.get("baud", BAUD_RATE))
+                        for name, s in config["sensors"].items()}
+        # One stream per camera source, shared by every zone that uses it
+        self.cameras = {name: CameraStream(source=str(source), ring_size=RING_SIZE)
+                        for name, source in config["cameras"].items()}
+        self.zones = [Zone(name, self.sensors[z["sensor"]], [self.cameras[c] for c in z["cameras"]],
+                           num_frames=z.get("frames", FRAMES_PER_ZONE),
+                           queue_size=z.get("queue_size", ZONE_QUEUE_SIZE))
+                      for name, z in config["zones"].items()]
+
+    def start(self):
+        for camera in self.cameras.values():
+            camera.start()
+        for sensor in self.sensors.values():
+            sensor.start()
+        for zone in self.zones:
+            self._spawn(self._capture_loop, f"zone-{zone.name}", zone)
+        for i in range(self.workers):
+            self._spawn(self._inference_loop, f"inference-{i}")
+        print(f"[INFO] Zone runtime: {len(self.zones)} zone(s), {len(self.sensors)} sensor(s), "
+              f"{len(self.cameras)} camera(s), {self.workers} inference worker(s)")
+        return self
+
+    def _spawn(self, target, name, *args):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for sensor in self.sensors.values():
+            sensor.stop()
+        for camera in self.cameras.values():
+            camera.stop()
+
+    # ---- per-zone capture ----
+
+    def _capture_loop(self, zone):
+        while not self._stop.is_set():
+            event = zone.sensor.wait_for(EVENT_MOTION, timeout=1.0)
+            if event is None:
+                continue
+            zone.stats["triggers"] += 1
+            with self._cond:
+                full = len(zone.queue) >= zone.queue_size
+            if full:
+                # Backpressure stays inside the zone: drop this trigger, let the sensor re-arm
+                zone.stats["dropped"] += 1
+                print(f"[WARN] Zone {zone.name}: {len(zone.queue)} trigger(s) already pending, dropping this one")
+                zone.sensor.send_resume()
+                continue
+
+            frames = zone.capture(event.timestamp)
+            if not frames:
+                print(f"[WARN] Zone {zone.name}: no frames from its camera(s)")
+                zone.sensor.send_resume()
+                continue
+            with self._cond:
+                zone.queue.append(Job(zone, frames, event.timestamp))
+                self._cond.notify()
+
+    # ---- shared inference pool ----
+
+    def _take_job(self):
+        """Next job, round-robin across zones; at most one job per zone runs at a time."""
+        with self._cond:
+            while not self._stop.is_set():
+                for offset in range(len(self.zones)):
+                    zone = self.zones[(self._next + offset) % len(self.zones)]
+                    if zone.queue and not zone.busy:
+                        self._next = (self._next + offset + 1) % len(self.zones)
+                        zone.busy = True
+                        return zone.queue.popleft()
+                self._cond.wait(timeout=1.0)
+        return None
+
+    def _inference_loop(self):
+        while True:
+            job = self._take_job()
+            if job is None:
+                return
+            zone = job.zone
+            log = lambda msg, name=zone.name: print(f"[{name}] {msg}")
+            try:
+                log(f"⏱️ Waited {time.monotonic() - job.queued_at:.2f}s for a worker")
+                zone.stats["last_result"] = self.pipeline(job.frames, zone.name, log)
+            except Exception as e:
+                zone.stats["last_result"] = "error"
+                log(f"❌ Pipeline failed: {e}")
+            finally:
+                zone.stats["processed"] += 1
+                zone.sensor.send_resume()
+                with self._cond:
+                    zone.busy = False
+                    self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            return {zone.name: dict(zone.stats, pending=len(zone.queue), busy=zone.busy,
+                                    sensor=zone.sensor.status()["connected"])
+                    for zone in self.zones}
@@ -0,0 +1,12 @@
+# tests/conftest.py
+#
+# Tests run against local stand-ins (SMTP/HTTP servers on 127.0.0.1, a pty
+# for the ESP32, SQLite for the database), never the real services.
+#
+#   python -m pytest -q
+
+import os
+import sys
+
+# Same trick as backend/flask_back.py: make the repo root importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
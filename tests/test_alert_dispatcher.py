@@ -0,0 +1,334 @@
+# tests/test_alert_dispatcher.py
+#
+# AlertDispatcher against stubbed channels, and the real email/Telegram
+# notifiers against local SMTP and HTTP stand-ins.
+
+import json
+import socket
+import threading
+import time
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.alert_dispatcher import Alert, AlertDispatcher, UNKNOWN_OUTCOME
+
+pytest.importorskip("dotenv")  # The notifiers load .env on import
+requests = pytest.importorskip("requests")
+
+from src import notifier, notifier_telegram  # noqa: E402
+
+
+def make_dispatcher(tmp_path, channels, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return AlertDispatcher(channels=channels, workers=1, coalesce_window=0,
+                           dead_letter_path=str(tmp_path / "dead_letter.jsonl"),
+                           rate_limits={name: None for name in channels}, **kwargs)
+
+
+def dead_letters(dispatcher):
+    try:
+        with open(dispatcher.dead_letter_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def deliver(dispatcher, image_path="frame.jpg"):
+    dispatcher.dispatch(Alert(image_path))
+    assert dispatcher.drain(timeout=15)
+    dispatcher.close(timeout=1)
+    return dispatcher.stats
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "intruder.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xe0 not really a jpeg \xff\xd9")
+    return str(path)
+
+
+# ---- retries, backoff, dead-lettering ----
+
+def test_failed_channel_is_retried_with_exponential_backoff(tmp_path):
+    calls = []
+
+    def flaky(alert):
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise ConnectionError("refused")
+
+    stats = deliver(make_dispatcher(tmp_path, {"flaky": flaky}, backoff=0.05))
+    assert stats["delivered"] == 1 and stats["retried"] == 2 and stats["dead_lettered"] == 0
+    assert calls[1] - calls[0] >= 0.05
+    assert calls[2] - calls[1] >= 0.10
+
+
+def test_channel_failing_every_attempt_is_dead_lettered(tmp_path):
+    calls = []
+
+    def down(alert):
+        calls.append(alert)
+        raise ConnectionError("refused")
+
+    def ok(alert):
+        pass
+
+    dispatcher = make_dispatcher(tmp_path, {"down": down, "ok": ok}, max_attempts=3)
+    stats = deliver(dispatcher)
+    assert len(calls) == 3
+    assert stats["delivered"] == 1 and stats["retried"] == 2 and stats["dead_lettered"] == 1
+    [record] = dead_letters(dispatcher)
+    assert record["channels"] == ["down"] and record["error"] == "refused"
+    assert record["image_path"] == "frame.jpg"
+
+
+def test_full_queue_is_dead_lettered(tmp_path):
+    release = threading.Event()
+    dispatcher = make_dispatcher(tmp_path, {"slow": lambda alert: release.wait(5)}, queue_size=1)
+    dispatcher.dispatch(Alert("first.jpg"))
+    time.sleep(0.2)  # Let the worker take it
+    assert dispatcher.dispatch(Alert("second.jpg"))
+    assert not dispatcher.dispatch(Alert("third.jpg"))
+    release.set()
+    assert dispatcher.drain(timeout=5)
+    [record] = dead_letters(dispatcher)
+    assert record["image_path"] == "third.jpg" and record["error"] == "queue full"
+
+
+# ---- unknown outcome ----
+
+@pytest.mark.parametrize("error", [TimeoutError("timed out"), requests.exceptions.ReadTimeout("read timed out")])
+def test_reply_timeout_is_dead_lettered_without_retry(tmp_path, error):
+    calls = []
+
+    def hangs(alert):
+        calls.append(alert)
+        raise error
+
+    dispatcher = make_dispatcher(tmp_path, {"hangs": hangs})
+    stats = deliver(dispatcher)
+    assert len(calls) == 1
+    assert stats["retried"] == 0 and stats["dead_lettered"] == 1
+    [record] = dead_letters(dispatcher)
+    assert record["error"].startswith(UNKNOWN_OUTCOME)
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ConnectTimeout("connect timed out"),
+                                   ConnectionError("SMTP connect failed")])
+def test_connect_failure_is_retried(tmp_path, error):
+    calls = []
+
+    def unreachable(alert):
+        calls.append(alert)
+        if len(calls) == 1:
+            raise error
+
+    stats = deliver(make_dispatcher(tmp_path, {"unreachable": unreachable}))
+    assert len(calls) == 2 and stats["retried"] == 1 and stats["delivered"] == 1
+
+
+# ---- email through a local SMTP server ----
+
+class FakeSMTPServer:
+    """
+    Just enough SMTP for smtplib. `hang_after_data` takes the message but
+    never acknowledges it; `silent` accepts connections and never speaks.
+    """
+
+    def __init__(self, hang_after_data=False, silent=False):
+        self.hang_after_data = hang_after_data
+        self.silent = silent
+        self.messages = []
+        self.connections = 0
+        self._stop = threading.Event()
+        self._conns = []
+        self._sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            self._conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        if self.silent:
+            self._stop.wait()
+            return
+        f = conn.makefile("rb")
+        try:
+            conn.sendall(b"220 localhost ready\r\n")
+            for line in f:
+                command = line.strip().upper()
+                if command == b"QUIT":
+                    conn.sendall(b"221 bye\r\n")
+                    return
+                if command != b"DATA":
+                    conn.sendall(b"250 ok\r\n")
+                    continue
+                conn.sendall(b"354 go ahead\r\n")
+                data = b"".join(iter(f.readline, b".\r\n"))
+                self.messages.append(data)
+                if self.hang_after_data:
+                    self._stop.wait()
+                    return
+                conn.sendall(b"250 queued\r\n")
+        except OSError:
+            pass
+
+    def close(self):
+        self._stop.set()
+        self._sock.close()
+        for conn in self._conns:
+            conn.close()
+
+
+@pytest.fixture
+def smtp_server(request):
+    server = FakeSMTPServer(**getattr(request, "param", {}))
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def smtp_env(monkeypatch):
+    monkeypatch.setattr(notifier, "SENDER_EMAIL", "alerts@example.com")
+    monkeypatch.setattr(notifier, "RECEIVER_EMAIL", "alerts@example.com")
+    monkeypatch.setattr(notifier, "EMAIL_PASSWORD", "app-password")
+    monkeypatch.setattr(notifier, "SMTP_TIMEOUT_S", 0.5)
+
+
+def email_channel(client):
+    def email(alert):
+        msg = EmailMessage()
+        msg["Subject"] = "Intruder"
+        msg["From"] = msg["To"] = "alerts@example.com"
+        msg.set_content(alert.image_path)
+        client.send(msg)
+    return {"email": email}
+
+
+def test_email_alerts_reuse_one_smtp_session(monkeypatch, smtp_env, smtp_server, image):
+    client = notifier.SMTPClient(host="127.0.0.1", port=smtp_server.port, use_ssl=False)
+    monkeypatch.setattr(notifier, "_client", client)
+    notifier.send_alert(image)
+    notifier.send_alert(image, body="second")
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 1
+    assert client.stats["connects"] == 1 and client.stats["reused"] == 1
+
+
+def test_missing_credentials_are_not_counted_as_delivered(tmp_path, monkeypatch, image):
+    monkeypatch.setattr(notifier, "SENDER_EMAIL", None)
+    dispatcher = make_dispatcher(tmp_path, {"email": lambda alert: notifier.send_alert(alert.image_path)})
+    stats = deliver(dispatcher, image)
+    assert stats["delivered"] == 0 and stats["dead_lettered"] == 1
+    assert "credentials" in dead_letters(dispatcher)[0]["error"]
+
+
+@pytest.mark.parametrize("smtp_server", [{"silent": True}], indirect=True)
+@pytest.mark.parametrize("use_ssl", [True, False])
+def test_smtp_connect_timeout_is_retried(tmp_path, smtp_env, smtp_server, use_ssl):
+    client = notifier.SMTPClient(host="127.0.0.1", port=smtp_server.port, use_ssl=use_ssl)
+    dispatcher = make_dispatcher(tmp_path, email_channel(client), max_attempts=2)
+    stats = deliver(dispatcher)
+    assert smtp_server.connections == 2
+    assert stats["retried"] == 1 and stats["dead_lettered"] == 1
+    [record] = dead_letters(dispatcher)
+    assert not record["error"].startswith(UNKNOWN_OUTCOME)
+
+
+@pytest.mark.parametrize("smtp_server", [{"hang_after_data": True}], indirect=True)
+def test_smtp_reply_timeout_is_not_resent(tmp_path, smtp_env, smtp_server):
+    client = notifier.SMTPClient(host="127.0.0.1", port=smtp_server.port, use_ssl=False)
+    dispatcher = make_dispatcher(tmp_path, email_channel(client))
+    stats = deliver(dispatcher)
+    assert len(smtp_server.messages) == 1 and smtp_server.connections == 1
+    assert stats["retried"] == 0 and stats["dead_lettered"] == 1
+    assert dead_letters(dispatcher)[0]["error"].startswith(UNKNOWN_OUTCOME)
+
+
+# ---- Telegram through a local Bot API stand-in ----
+
+class FakeBotAPI:
+    """Records Bot API calls; `failures` maps a method to how many calls of it answer 500."""
+
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = dict(failures or {})
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is visible
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                method = self.path.rsplit("/", 1)[-1]
+                api.calls.append(method)
+                status = 200
+                if api.failures.get(method, 0) > 0:
+                    api.failures[method] -= 1
+                    status = 500
+                body = json.dumps({"ok": status == 200}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+LOCATION = {"loc": "52.52,13.40", "city": "Berlin", "country": "DE"}
+
+
+@pytest.fixture
+def bot_api(request, monkeypatch):
+    api = FakeBotAPI(getattr(request, "param", None))
+    monkeypatch.setattr(notifier_telegram, "TELEGRAM_API_URL", api.url)
+    monkeypatch.setattr(notifier_telegram, "BOT_TOKEN", "123:test")
+    monkeypatch.setattr(notifier_telegram, "CHAT_ID", "42")
+    yield api
+    api.close()
+
+
+def telegram_channel():
+    def telegram(alert):
+        notifier_telegram.send_telegram_alert(alert.image_path, location_info=LOCATION, progress=alert.progress)
+    return {"telegram": telegram}
+
+
+@pytest.mark.parametrize("bot_api", [{"sendPhoto": 1}], indirect=True)
+def test_telegram_retry_only_sends_missing_parts(tmp_path, bot_api, image):
+    stats = deliver(make_dispatcher(tmp_path, telegram_channel()), image)
+    assert stats["delivered"] == 1 and stats["retried"] == 1
+    assert bot_api.calls == ["sendMessage", "sendPhoto", "sendPhoto", "sendLocation"]
+
+
+def test_telegram_alerts_reuse_connections(tmp_path, bot_api, image):
+    host = bot_api.url.split("//", 1)[1]
+    dispatcher = make_dispatcher(tmp_path, telegram_channel())
+    for _ in range(2):
+        dispatcher.dispatch(Alert(image))
+    assert dispatcher.drain(timeout=15)
+    dispatcher.close(timeout=1)
+    assert len(bot_api.calls) == 6
+    stats = notifier_telegram.connection_stats()[host]
+    assert stats["requests"] == 6 and stats["connections"] < stats["requests"]
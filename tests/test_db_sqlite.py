@@ -0,0 +1,145 @@
+# tests/test_db_sqlite.py
+#
+# db.py on DB_BACKEND=sqlite with a throwaway database file: the batched
+# background writer, its spool, migrations and the paged log queries.
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(db, "SQLITE_PATH", str(tmp_path / "detections.sqlite3"))
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_schema_ready", False)
+    return tmp_path
+
+
+@pytest.fixture
+def writer(sqlite_db):
+    w = db.DetectionLogWriter(spool_path=str(sqlite_db / "spool.jsonl"), batch_size=50,
+                              flush_interval=0.05, retry_interval=0.1)
+    yield w
+    w.close(timeout=5)
+
+
+def all_rows():
+    conn = db.get_connection()
+    try:
+        return conn.execute("SELECT timestamp, status, image_path FROM detection_logs ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+# ---- writer ----
+
+def test_writer_flushes_in_batches(writer, monkeypatch):
+    batches = []
+    insert = db.insert_detections
+    monkeypatch.setattr(db, "insert_detections", lambda rows: batches.append(len(rows)) or insert(rows))
+
+    for i in range(120):
+        writer.log(f"2025-05-01 10:00:{i % 60:02d}", "ALERT", f"img_{i}.jpg")
+    assert writer.flush(timeout=5)
+
+    assert writer.written == 120 and writer.spooled == 0
+    assert sum(batches) == 120 and max(batches) <= 50 and len(batches) < 120
+    rows = all_rows()
+    assert len(rows) == 120 and rows[0] == ("2025-05-01 10:00:00", "ALERT", "img_0.jpg")
+
+
+def test_writer_spools_while_the_db_is_down_and_replays(writer, monkeypatch):
+    insert = db.insert_detections
+    down = True
+
+    def flaky_insert(rows):
+        if down:
+            raise ConnectionError("database unreachable")
+        return insert(rows)
+    monkeypatch.setattr(db, "insert_detections", flaky_insert)
+
+    for i in range(10):
+        writer.log(f"2025-05-01 10:00:{i:02d}", "ALERT", f"img_{i}.jpg")
+    assert writer.flush(timeout=5)
+    assert writer.spooled == 10 and writer.written == 0
+    with open(writer.spool_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 10
+
+    down = False
+    assert wait_until(lambda: not writer.status()["spool_pending"])
+    assert writer.written == 10
+    assert [r[2] for r in all_rows()] == [f"img_{i}.jpg" for i in range(10)]
+    assert not os.path.exists(writer.spool_path + ".replay")
+
+
+# ---- migrations ----
+
+def test_migrate_is_idempotent(sqlite_db):
+    conn = db.get_connection()
+    try:
+        assert db.migrate(conn) == [version for version, _, _ in db.MIGRATIONS]
+        assert db.migrate(conn) == []
+        versions = [r[0] for r in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+        assert versions == [version for version, _, _ in db.MIGRATIONS]
+    finally:
+        conn.close()
+
+
+# ---- queries ----
+
+@pytest.fixture
+def logs(sqlite_db):
+    """25 rows, 5 per minute with duplicate timestamps, so paging has to break ties on id."""
+    start = datetime(2025, 5, 1, 23, 58)
+    rows = []
+    for i in range(25):
+        timestamp = (start + timedelta(minutes=i // 5)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((timestamp, "ALERT" if i % 2 else "AUTHORIZED", f"img_{i}.jpg"))
+    db.insert_detections(rows)
+    return rows
+
+
+def test_query_logs_pages_newest_first_without_gaps(logs):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = db.query_logs(cursor=cursor, limit=10)
+        pages.append(rows)
+        if cursor is None:
+            break
+    assert [len(p) for p in pages] == [10, 10, 5]
+
+    seen = [r for page in pages for r in page]
+    assert [r["image_path"] for r in seen] == [f"img_{i}.jpg" for i in reversed(range(25))]
+    assert len({r["id"] for r in seen}) == 25
+
+
+def test_query_logs_filters(logs):
+    rows, cursor = db.query_logs(status="ALERT", start="2025-05-02 00:00:00", end="2025-05-02 00:01:00", limit=50)
+    assert cursor is None
+    assert [r["image_path"] for r in rows] == ["img_13.jpg", "img_11.jpg"]
+
+
+def test_count_logs(logs):
+    assert db.count_logs("day") == [
+        {"bucket": "2025-05-01", "status": "ALERT", "count": 5},
+        {"bucket": "2025-05-01", "status": "AUTHORIZED", "count": 5},
+        {"bucket": "2025-05-02", "status": "ALERT", "count": 7},
+        {"bucket": "2025-05-02", "status": "AUTHORIZED", "count": 8},
+    ]
+    hourly = db.count_logs("hour", status="ALERT")
+    assert [(r["bucket"], r["count"]) for r in hourly] == [("2025-05-01 23:00:00", 5), ("2025-05-02 00:00:00", 7)]
+    with pytest.raises(ValueError):
+        db.count_logs("week")
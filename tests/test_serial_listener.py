@@ -0,0 +1,132 @@
+# tests/test_serial_listener.py
+#
+# SerialService against a fake ESP32 on a pseudo-terminal, plugged in
+# through the `opener=` hook.
+
+import os
+import re
+import select
+import sys
+import time
+import threading
+
+import pytest
+
+from src.serial_listener import (SerialService, parse_event, EVENT_MOTION, EVENT_DISTANCE,
+                                 EVENT_PAUSED, EVENT_RESUMED, EVENT_NO_ECHO, EVENT_LINE,
+                                 EVENT_DISCONNECTED)
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs a pty")
+serial = pytest.importorskip("serial")
+
+SKETCH = os.path.join(os.path.dirname(__file__), "..", "arduino", "ultrasonic_trig", "ultrasonic_trig.ino")
+
+# Every line the sketch prints, as the ESP32 sends it
+SKETCH_LINES = {
+    "⏸️ Paused. Waiting for 'resume' command...": (EVENT_PAUSED, None),
+    "✅ Resuming distance tracking...": (EVENT_RESUMED, None),
+    "⚠️ No echo received (timeout).": (EVENT_NO_ECHO, None),
+    "Distance (cm): 12.34": (EVENT_DISTANCE, 12.34),  # Serial.print + Serial.println(float)
+    "motion": (EVENT_MOTION, None),
+}
+
+
+def test_table_covers_the_sketch():
+    with open(SKETCH, encoding="utf-8") as f:
+        printed = set(re.findall(r'Serial\.print(?:ln)?\("([^"]*)"\)', f.read()))
+    assert {line.split(": ")[0] + ": " if line.startswith("Distance") else line
+            for line in SKETCH_LINES} == printed
+
+
+@pytest.mark.parametrize("line, expected", SKETCH_LINES.items())
+def test_parse_sketch_lines(line, expected):
+    event = parse_event(line + "\r\n")
+    assert (event.kind, event.value) == expected
+
+
+def test_unknown_line():
+    assert parse_event("rst:0x1 (POWERON_RESET)").kind == EVENT_LINE
+
+
+class FakeESP32:
+    """The far end of a pty; every open() makes a fresh pty, like replugging the board."""
+
+    def __init__(self):
+        self.master = None
+        self.opens = 0
+
+    def open(self):
+        import pty
+        if self.master is not None:
+            os.close(self.master)
+        self.master, slave = pty.openpty()
+        name = os.ttyname(slave)
+        os.close(slave)
+        self.opens += 1
+        return serial.Serial(name, 115200, timeout=0.1)
+
+    def println(self, line):
+        os.write(self.master, line.encode("utf-8") + b"\r\n")
+
+    def read(self, timeout=2.0):
+        data, deadline = b"", time.monotonic() + timeout
+        while not data.endswith(b"\n") and time.monotonic() < deadline:
+            if select.select([self.master], [], [], 0.1)[0]:
+                data += os.read(self.master, 1024)
+        return data
+
+    def unplug(self):
+        os.close(self.master)
+        self.master = None
+
+    def close(self):
+        if self.master is not None:
+            self.unplug()
+
+
+@pytest.fixture
+def esp32():
+    board = FakeESP32()
+    service = SerialService(port="fake", opener=board.open).start()
+    assert service._connected.wait(2)
+    yield board, service
+    service.stop()
+    board.close()
+
+
+def test_wait_for_times_out(esp32):
+    board, service = esp32
+    started = time.monotonic()
+    assert service.wait_for(EVENT_MOTION, timeout=0.3) is None
+    assert 0.3 <= time.monotonic() - started < 1.0
+
+
+def test_wait_for_delivers_only_its_kind(esp32):
+    board, service = esp32
+    # Sent once wait_for() is listening; lines nobody waits for aren't queued
+    threading.Timer(0.2, lambda: (board.println("Distance (cm): 55.00"), board.println("motion"))).start()
+    event = service.wait_for(EVENT_MOTION, timeout=2)
+    assert event.kind == EVENT_MOTION and event.line == "motion"
+    assert service.status()["events"][EVENT_DISTANCE] == 1
+
+
+def test_send_resume_writes_a_line(esp32):
+    board, service = esp32
+    service.send_resume()
+    assert board.read() == b"resume\n"
+
+
+def test_reopens_after_read_error(esp32):
+    board, service = esp32
+    disconnected = []
+    service.subscribe(disconnected.append, [EVENT_DISCONNECTED])
+    board.unplug()
+
+    deadline = time.monotonic() + 5
+    while board.opens < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert board.opens == 2 and disconnected
+    assert service._connected.wait(2)
+
+    threading.Timer(0.2, board.println, ["motion"]).start()
+    assert service.wait_for(EVENT_MOTION, timeout=2) is not None
@@ -0,0 +1,105 @@
+# utils/bench_startup.py
+#
+# Tracks cold-start cost: import time of the main entry modules (each in a
+# fresh interpreter) and time to the first face embedding, in-process and
+# through the inference daemon when it is running.
+#
+#   python utils/bench_startup.py [--json results.json] [--no-inference]
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+MODULES = ["db", "src.predict_with_embed", "src.predictor", "main", "backend.flask_back"]
+SAMPLE_DIR = os.path.join(ROOT, "backend", "data", "captured")
+
+IMPORT_SNIPPET = (
+    "import time, sys; t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t); "
+    "print(int(any(m in sys.modules for m in ('tensorflow', 'deepface'))))"
+)
+
+
+def time_import(module):
+    """Import time in a fresh interpreter, and whether TensorFlow/DeepFace got pulled in."""
+    proc = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"module": module, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"}
+    seconds, heavy = proc.stdout.strip().splitlines()[-2:]
+    return {"module": module, "import_s": round(float(seconds), 3), "loads_tensorflow": heavy == "1"}
+
+
+def sample_image():
+    import cv2
+    for name in sorted(os.listdir(SAMPLE_DIR)):
+        if name.endswith(".jpg"):
+            return cv2.imread(os.path.join(SAMPLE_DIR, name))
+    raise FileNotFoundError(f"No sample JPEG in {SAMPLE_DIR}")
+
+
+def time_first_inference():
+    from src.predict_with_embed import load_model, get_embeddings_batch
+    from src.inference_server import InferenceClient
+
+    image = sample_image()
+    results = {}
+
+    client = InferenceClient()
+    if client.available():
+        start = time.perf_counter()
+        client.embed_images([image])
+        results["daemon_first_embed_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    model = load_model()
+    results["model_load_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    get_embeddings_batch(model, [image])
+    results["first_embed_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    get_embeddings_batch(model, [image])
+    results["warm_embed_s"] = round(time.perf_counter() - start, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark")
+    parser.add_argument("--json", help="Also write results to this file")
+    parser.add_argument("--no-inference", action="store_true", help="Only measure imports")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "imports": [time_import(m) for m in MODULES]}
+
+    print("\n⏱️ Import time (fresh interpreter)")
+    for row in report["imports"]:
+        if "error" in row:
+            print(f"  {row['module']:<26} ❌ {row['error']}")
+        else:
+            heavy = "  ⚠️ loads TensorFlow" if row["loads_tensorflow"] else ""
+            print(f"  {row['module']:<26} {row['import_s']:>7.3f}s{heavy}")
+
+    if not args.no_inference:
+        report["inference"] = time_first_inference()
+        print("\n⏱️ First inference")
+        for key, value in report["inference"].items():
+            print(f"  {key:<26} {value:>7.3f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,238 @@
-import streamlit as st
-import cv2
+# utils/cctv_stream.py
+#
+# One background relay per CCTV URL: the stream is decoded once, downscaled
+# and JPEG-encoded once per frame, and served as MJPEG to any number of
+# viewers from a small HTTP server in this process. Each viewer always gets
+# the newest frame, so a slow client skips frames instead of lagging behind
+# or holding the others up. A relay closes its camera once nobody has
+# watched it for RELAY_IDLE_S.
+#
+#   python utils/cctv_stream.py http://192.168.x.x:8080/video   # standalone relay
+
+import os
+import sys
 import time
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+# Loopback by default: the feed is unauthenticated, so only viewers on this
+# machine can reach it unless RELAY_HOST is set to a LAN address
+RELAY_HOST = os.getenv("RELAY_HOST", "127.0.0.1")
+RELAY_PORT = int(os.getenv("RELAY_PORT", "8765"))
+RELAY_PUBLIC_URL = os.getenv("RELAY_PUBLIC_URL")  # As the browser sees it; derived from RELAY_HOST when unset
+RELAY_WIDTH = int(os.getenv("RELAY_WIDTH", "640"))   # Frames are downscaled to at most this width
+RELAY_FPS = float(os.getenv("RELAY_FPS", "15"))      # Encoded frames per second, at most
+RELAY_JPEG_QUALITY = 70
+RELAY_IDLE_S = 30.0
+RELAY_CLIENT_TIMEOUT_S = 10.0  # A viewer that can't take a frame for this long is dropped
+REOPEN_DELAY_S = 2.0
+BOUNDARY = "frame"
+
+
+class MJPEGRelay:
+    def __init__(self, url, width=RELAY_WIDTH, fps=RELAY_FPS, quality=RELAY_JPEG_QUALITY):
+        self.url = url
+        self.id = uuid.uuid4().hex  # Viewers address relays by id, never by camera URL
+        self.width = width
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.quality = quality
+        self.viewers = 0
+        self.error = None
+        self._jpeg = None
+        self._seq = 0
+        self._last_seen = time.monotonic()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            self._last_seen = time.monotonic()
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="cctv-relay", daemon=True)
+            self._thread.start()
+        return self
+
+    def _idle(self):
+        return self.viewers == 0 and time.monotonic() - self._last_seen > RELAY_IDLE_S
+
+    def _stopping(self):
+        """True (and the relay marked stopped) once idle; checked under the lock so start() can't miss it."""
+        with self._cond:
+            if self._idle():
+                self._thread = None
+                return True
+            return False
+
+    def _encode(self, image):
+        h, w = image.shape[:2]
+        if w > self.width:
+            image = cv2.resize(image, (self.width, int(h * self.width / w)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return jpeg.tobytes() if ok else None
+
+    def _run(self):
+        while not self._stopping():
+            cap = cv2.VideoCapture(self.url)
+            if not cap.isOpened():
+                self.error = "Unable to access the CCTV stream."
+                print(f"❌ Relay could not open {self.url}, retrying in {REOPEN_DELAY_S:.0f}s")
+                time.sleep(REOPEN_DELAY_S)
+                continue
+
+            print(f"📹 Relay opened {self.url}")
+            self.error = None
+            next_encode = 0.0
+            while not self._idle():  # Unlocked peek; _stopping() decides
+                ret, image = cap.read()  # Keep reading at the source rate so the decoder never lags
+                if not ret:
+                    self.error = "Failed to read from stream."
+                    print("⚠️ Relay read failed, reopening...")
+                    break
+                now = time.monotonic()
+                if now < next_encode:
+                    continue
+                next_encode = now + self.interval
+                jpeg = self._encode(image)
+                if jpeg:
+                    with self._cond:
+                        self._jpeg, self._seq = jpeg, self._seq + 1
+                        self._cond.notify_all()
+            cap.release()
+        print(f"[INFO] Relay for {self.url} closed after {RELAY_IDLE_S:.0f}s without viewers")
+
+    def frames(self):
+        """Yields the newest JPEG each time one is encoded; frames a slow viewer missed are skipped."""
+        seen = 0
+        with self._cond:
+            self.viewers += 1
+        try:
+            while True:
+                with self._cond:
+                    if not self._cond.wait_for(lambda: self._seq > seen, timeout=RELAY_IDLE_S):
+                        return  # Source stalled
+                    seen, jpeg = self._seq, self._jpeg
+                yield jpeg
+        finally:
+            with self._cond:
+                self.viewers -= 1
+                self._last_seen = time.monotonic()
+
+
+_relays = {}       # camera URL -> relay
+_relays_by_id = {}
+_relays_lock = threading.Lock()
+_server = None
+
+
+def get_relay(url):
+    """Shared relay for `url`, (re)started if it had gone idle."""
+    with _relays_lock:
+        relay = _relays.get(url)
+        if relay is None:
+            relay = _relays[url] = MJPEGRelay(url)
+            _relays_by_id[relay.id] = relay
+        return relay.start()
+
+
+class _RelayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"  # No keep-alive: the stream ends when the viewer goes away
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        relay = _relays_by_id.get(parts[1]) if len(parts) == 2 and parts[0] == "stream" else None
+        if relay is None:
+            self.send_error(404, "Unknown stream")
+            return
+        relay.start()
+        self.connection.settimeout(RELAY_CLIENT_TIMEOUT_S)
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for jpeg in relay.frames():
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except OSError:
+            pass  # Viewer closed the page or was too slow
+
+    def log_message(self, format, *args):
+        pass  # One line per viewer connection is just noise on the dashboard console
+
+
+def start_relay_server(host=RELAY_HOST, port=RELAY_PORT):
+    """Starts the MJPEG server once per process; later calls are no-ops."""
+    global _server
+    with _relays_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _RelayHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="cctv-relay-server", daemon=True).start()
+            print(f"[INFO] CCTV relay serving on {host}:{port}")
+        return _server
+
+
+def public_url(host=RELAY_HOST, port=RELAY_PORT):
+    """Base URL viewers' browsers use to reach the relay."""
+    if RELAY_PUBLIC_URL:
+        return RELAY_PUBLIC_URL.rstrip("/")
+    if host in ("", "0.0.0.0", "::"):
+        raise RuntimeError("RELAY_HOST listens on every interface, so the address viewers use can't be "
+                           "guessed; set RELAY_PUBLIC_URL (e.g. http://192.168.1.5:8765)")
+    if host in ("127.0.0.1", "localhost", "::1"):
+        return f"http://localhost:{port}"  # Viewers on this machine only
+    return f"http://{host}:{port}"
+
+
+def stream_url(url):
+    """Browser-facing MJPEG URL for the CCTV stream at `url`."""
+    base = public_url()  # Fails before opening a port if the relay can't be reached as configured
+    start_relay_server()
+    return f"{base}/stream/{get_relay(url).id}"
+
 
 def start_stream(cctv_url):
+    import streamlit as st
+
     st.subheader("📹 Live CCTV Feed")
 
     # Initialize stream control state
     if 'stream_active' not in st.session_state:
         st.session_state.stream_active = True
-    else:
-        st.session_state.stream_active = True  # Ensure it's turned on each time this function runs
 
-    cap = cv2.VideoCapture(cctv_url)
-    if not cap.isOpened():
-        st.error("❌ Unable to access the CCTV stream.")
+    # Stop button (with unique key to avoid Streamlit duplicate ID error)
+    col_stop, col_start = st.columns(2)
+    if col_stop.button("❌ Stop Stream", key="stop_stream_btn"):
         st.session_state.stream_active = False
+    if col_start.button("▶️ Start Stream", key="start_stream_btn"):
+        st.session_state.stream_active = True
+
+    if not st.session_state.stream_active:
+        st.success("✅ Stream ended.")
         return
 
-    frame_placeholder = st.empty()
+    # The browser pulls frames from the shared relay; this script returns
+    # immediately, so the rest of the page keeps working
+    src = stream_url(cctv_url)
+    relay = get_relay(cctv_url)
+    if relay.error:
+        st.warning(f"⚠️ {relay.error} Retrying in the background.")
+    st.markdown(f'<img src="{src}" style="width:100%" alt="Live CCTV feed">', unsafe_allow_html=True)
 
-    # Stop button (with unique key to avoid Streamlit duplicate ID error)
-    stop_button = st.button("❌ Stop Stream", key="stop_stream_btn")
-    if stop_button:
-        st.session_state.stream_active = False
 
-    # Main loop
-    while st.session_state.stream_active:
-        ret, frame = cap.read()
-        if not ret:
-            st.warning("⚠️ Failed to read from stream.")
-            break
-        frame_placeholder.image(frame, channels="BGR", use_container_width=True)
-        time.sleep(0.03)  # ~30 FPS
-
-        # Use the session state flag to break the loop (avoid placing another button here)
-
-    cap.release()
-    frame_placeholder.empty()
-    st.success("✅ Stream ended.")
-    st.session_state.stream_active = False
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python utils/cctv_stream.py <cctv_url>")
+        sys.exit(1)
+    print(f"📺 Watch at {stream_url(sys.argv[1])}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print("\n🚪 Exiting via Ctrl+C")
@@ -1,30 +1,138 @@
 import sys
 import os
+import io
+import csv
+import json
+import time
+import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from db import log_detection_to_db
+import db
+from utils.log_reader import parse_line
 from dotenv import load_dotenv
 
 load_dotenv()
 
 LOG_FILE = "logs/detections.log"
+STATE_FILE = "logs/.import_offset.json"
+CHUNK_ROWS = 5000
+FINGERPRINT_BYTES = 64  # Start of the file, used to notice it was replaced
 
-def import_existing_logs():
-    if not os.path.exists(LOG_FILE):
+STAGING_TABLE = "detection_logs_import"
+MERGE_SQL = """
+INSERT INTO detection_logs (timestamp, status, image_path)
+SELECT DISTINCT s.timestamp, s.status, s.image_path FROM {staging} s
+WHERE NOT EXISTS (
+    SELECT 1 FROM detection_logs d
+    WHERE d.timestamp = s.timestamp AND d.status = s.status AND d.image_path {same} s.image_path
+)
+"""
+
+
+def read_chunks(path, offset, chunk_rows=CHUNK_ROWS):
+    """
+    Yields (rows, end_offset) for complete lines starting at byte `offset`.
+    A trailing line without a newline is left for the next run (it may still
+    be being written).
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        rows = []
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+            row = parse_line(raw.decode("utf-8", errors="replace"))
+            if row:
+                rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield rows, offset
+                rows = []
+        if rows or offset:
+            yield rows, offset
+
+
+def _fingerprint(path):
+    with open(path, "rb") as f:
+        return f.read(FINGERPRINT_BYTES).hex()
+
+
+def load_state(path, state_file=STATE_FILE):
+    """Saved byte offset for `path`, or 0 if the file was truncated or replaced since."""
+    if not os.path.exists(state_file):
+        return 0
+    with open(state_file) as f:
+        state = json.load(f)
+    if state.get("path") != os.path.abspath(path):
+        return 0
+    if os.path.getsize(path) < state.get("offset", 0) or _fingerprint(path) != state.get("fingerprint"):
+        print("[INFO] Log file was rotated or rewritten; importing from the start (duplicates are skipped).")
+        return 0
+    return state["offset"]
+
+
+def save_state(path, offset, state_file=STATE_FILE):
+    os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+    tmp = state_file + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"path": os.path.abspath(path), "offset": offset, "fingerprint": _fingerprint(path)}, f)
+    os.replace(tmp, state_file)
+
+
+def merge_chunk(rows):
+    """
+    Bulk-loads one chunk into a staging table and merges it into
+    detection_logs, skipping rows already present on
+    (timestamp, status, image_path). Returns the number of new rows.
+    """
+    if not rows:
+        return 0
+    with db.pooled_connection() as conn:
+        cur = conn.cursor()
+        if db.DB_BACKEND == "sqlite":
+            cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (timestamp TEXT, status TEXT, image_path TEXT)")
+            cur.execute(f"DELETE FROM {STAGING_TABLE}")
+            cur.executemany(f"INSERT INTO {STAGING_TABLE} VALUES (?, ?, ?)", rows)
+            cur.execute(MERGE_SQL.format(staging=STAGING_TABLE, same="IS"))
+        else:
+            # Same column types as the target; dropped when the transaction commits
+            cur.execute(f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+                        "SELECT timestamp, status, image_path FROM detection_logs WITH NO DATA")
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {STAGING_TABLE} (timestamp, status, image_path) FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute(MERGE_SQL.format(staging=STAGING_TABLE, same="IS NOT DISTINCT FROM"))
+        inserted = cur.rowcount
+        cur.close()
+    return inserted
+
+
+def import_existing_logs(log_file=LOG_FILE, state_file=STATE_FILE, chunk_rows=CHUNK_ROWS, restart=False):
+    if not os.path.exists(log_file):
         print("❌ Log file not found.")
         return
 
-    with open(LOG_FILE, "r") as file:
-        for line in file:
-            line = line.strip()
-            if not line or "|" not in line:
-                continue
-            parts = line.split(" | ")
-            if len(parts) == 3:
-                timestamp, status, image_path = parts
-                log_detection_to_db(timestamp, status, image_path)
+    offset = 0 if restart else load_state(log_file, state_file)
+    if offset:
+        print(f"[INFO] Resuming {log_file} from byte {offset}")
+
+    started = time.perf_counter()
+    parsed = inserted = 0
+    for rows, end_offset in read_chunks(log_file, offset, chunk_rows):
+        inserted += merge_chunk(rows)
+        parsed += len(rows)
+        save_state(log_file, end_offset, state_file)  # Only after the chunk is committed
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Imported {inserted} new row(s) from {parsed} parsed line(s) in {elapsed:.1f}s.")
 
-    print("✅ Existing logs imported to NeonDB.")
 
 if __name__ == "__main__":
-    import_existing_logs()
+    parser = argparse.ArgumentParser(description="Bulk-import logs/detections.log into detection_logs")
+    parser.add_argument("--file", default=LOG_FILE)
+    parser.add_argument("--state", default=STATE_FILE, help="Where the resume offset is kept")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved offset")
+    args = parser.parse_args()
+    import_existing_logs(args.file, args.state, args.chunk_rows, args.restart)
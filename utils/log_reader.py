@@ -0,0 +1,197 @@
+# utils/log_reader.py
+#
+# Reads logs/detections.log (or a JSON Lines segment of src/event_log.py)
+# without loading the whole file: the newest
+# entries come from seeking backwards from the end, and a small sidecar
+# index (<log>.idx.json) keeps byte offsets per day and the last offset per
+# status. The index is caught up incrementally from where it stopped, so
+# every call costs the same no matter how large the log has grown.
+
+import os
+import json
+
+LOG_FILE = "logs/detections.log"
+BLOCK_SIZE = 8192
+FINGERPRINT_BYTES = 64  # Start of the file, used to notice it was replaced
+
+
+def parse_line(line):
+    """
+    (timestamp, status, image_path) from any of the log formats:
+      {"timestamp": "2025-04-08 04:55:47", "status": "AUTHORIZED", ...}   (event log)
+      2025-04-08 04:55:47 | AUTHORIZED | data/captured/x.jpg
+      2025-04-08 03:59:18 - data/captured/x.jpg        (older, alerts only)
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            event = json.loads(line)
+            return event["timestamp"], event["status"], event.get("image_path")
+        except (ValueError, KeyError):
+            return None
+    parts = line.split(" | ")
+    if len(parts) == 3:
+        return tuple(parts)
+    # Legacy format: the timestamp is fixed-width, so split there rather than on " - "
+    if len(line) > 22 and line[19:22] == " - ":
+        return line[:19], "ALERT", line[22:]
+    return None
+
+
+def _record(raw, offset):
+    if raw.startswith(b"{"):
+        try:
+            event = json.loads(raw)
+            if "timestamp" in event and "status" in event:
+                return dict(event, offset=offset)
+        except ValueError:
+            pass
+        return None
+    parsed = parse_line(raw.decode("utf-8", errors="replace"))
+    if not parsed:
+        return None
+    timestamp, status, image_path = parsed
+    return {"timestamp": timestamp, "status": status, "image_path": image_path, "offset": offset}
+
+
+class LogReader:
+    def __init__(self, path=LOG_FILE):
+        self.path = path
+        self.index_path = path + ".idx.json"
+        self._index = None
+
+    # ---- sidecar index ----
+
+    def _fingerprint(self):
+        with open(self.path, "rb") as f:
+            return f.read(FINGERPRINT_BYTES).hex()
+
+    def _empty_index(self):
+        return {"indexed_to": 0, "fingerprint": None, "days": {}, "last": {}}
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = self._empty_index()
+        return self._index
+
+    def refresh(self):
+        """Indexes lines appended since the last call. Returns the index."""
+        if not os.path.exists(self.path):
+            self._index = self._empty_index()
+            return self._index
+
+        index = self._load_index()
+        size = os.path.getsize(self.path)
+        fingerprint = self._fingerprint()
+        if size < index["indexed_to"] or (index["fingerprint"] and fingerprint[:len(index["fingerprint"])] != index["fingerprint"]):
+            index = self._index = self._empty_index()  # Truncated or replaced: start over
+
+        if size == index["indexed_to"]:
+            return index
+
+        offset = index["indexed_to"]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Partially written line; picked up next time
+                record = _record(raw, offset)
+                offset += len(raw)
+                if not record:
+                    continue
+                day = index["days"].setdefault(record["timestamp"][:10],
+                                               {"start": record["offset"], "end": offset, "counts": {}})
+                day["end"] = offset
+                day["counts"][record["status"]] = day["counts"].get(record["status"], 0) + 1
+                index["last"][record["status"]] = record["offset"]
+
+        index["indexed_to"] = offset
+        index["fingerprint"] = fingerprint
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_path)
+        return index
+
+    # ---- reads ----
+
+    def _read_at(self, offset):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return _record(f.readline(), offset)
+
+    def _lines_backwards(self, before=None):
+        """Yields (offset, raw_line) from `before` (default EOF) towards the start."""
+        with open(self.path, "rb") as f:
+            position = os.path.getsize(self.path) if before is None else before
+            tail = b""
+            while position > 0:
+                step = min(BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                chunk = f.read(step) + tail
+                lines = chunk.split(b"\n")
+                tail = lines.pop(0)  # May continue in the previous block
+                end = position + len(chunk)
+                for line in reversed(lines):
+                    end -= len(line) + 1
+                    yield end + 1, line + b"\n"
+            if tail:
+                yield 0, tail + b"\n"
+
+    def latest(self, status=None):
+        """Most recent record (optionally of `status`), without reading the file front to back."""
+        if not os.path.exists(self.path):
+            return None
+        if status is None:
+            records, _ = self.tail(1)
+            return records[0] if records else None
+        index = self.refresh()
+        offset = index["last"].get(status)
+        return self._read_at(offset) if offset is not None else None
+
+    def tail(self, limit=50, before=None, status=None):
+        """
+        Newest-first page of up to `limit` records ending before byte `before`.
+        Returns (records, next_before); pass next_before back for the next
+        (older) page. next_before is None once the start of the file is reached.
+        """
+        if not os.path.exists(self.path):
+            return [], None
+        records = []
+        for offset, raw in self._lines_backwards(before):
+            record = _record(raw, offset)
+            if record and (status is None or record["status"] == status):
+                records.append(record)
+                if len(records) == limit:
+                    return records, offset or None
+        return records, None
+
+    def days(self):
+        """{day: {"start", "end", "counts"}} for every day in the log."""
+        return self.refresh()["days"]
+
+    def read_range(self, start_day, end_day=None, status=None):
+        """Records from `start_day` through `end_day` (inclusive, YYYY-MM-DD), oldest first."""
+        days = self.days()
+        selected = [d for d in sorted(days) if d >= start_day and (end_day is None or d <= end_day)]
+        if not selected:
+            return []
+        start, end = days[selected[0]]["start"], days[selected[-1]]["end"]
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            while offset < end:
+                raw = f.readline()
+                record = _record(raw, offset)
+                offset += len(raw)
+                if record and (status is None or record["status"] == status):
+                    records.append(record)
+        return records